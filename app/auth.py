@@ -1,31 +1,147 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from uuid import UUID
 
 import jwt
 from pwdlib import PasswordHash
-from fastapi import Depends, Header, HTTPException
+from fastapi import Depends, Header, HTTPException, Query
+from sqlalchemy import event, select
 
+from cache import TTLCache
 from database import get_db
+from generations import bump_counters, principal_scope, read_generations
+from metrics import CallbackMetric, jwt_decode_seconds, password_hash_seconds, register
 from models import User
+from schemas import AuthenticatedUser
 from settings import settings
 
+# Verified access token -> (AuthenticatedUser snapshot, principal generation),
+# so that repeat requests with the same token skip the JWT decode and the
+# users lookup. A hit still reads the user's generation, which every change
+# to the user bumps, so no worker keeps serving a demoted or deleted user.
+principal_cache = TTLCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+
+password_hash = PasswordHash.recommended()
+
+
+class PasswordHashPool:
+    """Runs argon2 work on a fixed number of threads, off the event loop.
+
+    argon2-cffi releases the GIL while hashing, so threads give real CPU
+    parallelism while the worker count bounds how many cores auth may use.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.peak_queued = 0
+        self._busy_seconds = 0.0
+
+    def _retry_after(self) -> int:
+        # Time for the queue ahead to drain at the observed call duration.
+        average = self._busy_seconds / self.completed if self.completed else 0.1
+        return max(1, math.ceil(average * (self.queued + 1) / self.workers))
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Server busy, retry later",
+                    headers={"Retry-After": str(self._retry_after())},
+                )
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        started = threading.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._call, started, func, *args)
+        finally:
+            # A call cancelled before a thread picked it up never reaches _call.
+            if not started.is_set():
+                with self._lock:
+                    self.queued -= 1
+
+    def _call(self, started, func, *args):
+        with self._lock:
+            started.set()
+            self.queued -= 1
+            self.running += 1
+        call_started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - call_started
+            password_hash_seconds.observe(elapsed)
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self._busy_seconds += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "peak_queued": self.peak_queued,
+            }
+
+
+hash_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+register(CallbackMetric(
+    "dkn_password_hash_queued", "argon2 calls waiting for a worker thread.", (),
+    lambda: {(): hash_pool.stats()["queued"]},
+))
+register(CallbackMetric(
+    "dkn_password_hash_rejected_total", "argon2 calls shed with 429 because the queue was full.", (),
+    lambda: {(): hash_pool.stats()["rejected"]}, type="counter",
+))
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    ph = PasswordHash.recommended()
-    return ph.verify(plain_password, hashed_password)
+    return password_hash.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    ph = PasswordHash.recommended()
-    return ph.hash(password)
+    return password_hash.hash(password)
+
 
+async def hash_password(password: str) -> str:
+    return await hash_pool.run(get_password_hash, password)
 
-def authenticate_user(db_session, email: str, password: str):
-    user = db_session.query(User).filter(User.email == email).first()
+
+async def authenticate_user(db_session, email: str, password: str):
+    user = await db_session.scalar(select(User).where(User.email == email))
     if not user:
         return False
-    if not verify_password(password, user.password):
+
+    valid, updated_hash = await hash_pool.run(password_hash.verify_and_update, password, user.password)
+    if not valid:
         return False
+
+    # The stored hash was made with older argon2 parameters; upgrade it now
+    # that we have the plain password.
+    if updated_hash is not None:
+        user.password = updated_hash
+        await db_session.commit()
+
     return user
 
 
@@ -58,11 +174,12 @@ def create_refresh_token(data: dict):
 
 def decode_token(token: str):
     try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.PASSWORD_HASH_ALGORITHM],
-        )
+        with jwt_decode_seconds.time():
+            payload = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=[settings.PASSWORD_HASH_ALGORITHM],
+            )
         return payload
     except jwt.ExpiredSignatureError:
         return None
@@ -76,14 +193,21 @@ def get_token(auth: str = Header(..., alias="Authorization")):
     return auth[len("Bearer "):]
 
 
-def auth_user(db_session=Depends(get_db), token: str = Depends(get_token)):
+async def auth_user(db_session=Depends(get_db), token: str = Depends(get_token)):
+    cached = principal_cache.get(token)
+    if cached is not None:
+        current_user, cached_generation = cached
+        generation, = await read_generations(db_session, principal_scope(current_user.id))
+        if generation == cached_generation:
+            return current_user
 
     try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.PASSWORD_HASH_ALGORITHM],
-        )
+        with jwt_decode_seconds.time():
+            payload = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=[settings.PASSWORD_HASH_ALGORITHM],
+            )
 
         id: str = payload.get("sub")
         if id is None:
@@ -92,16 +216,62 @@ def auth_user(db_session=Depends(get_db), token: str = Depends(get_token)):
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db_session.query(User).filter(User.id == UUID(id)).first()
+    # Read before the user, so a change committed in between leaves the
+    # snapshot with an already stale generation rather than a fresh one.
+    generation, = await read_generations(db_session, principal_scope(UUID(id)))
+    user = await db_session.get(User, UUID(id))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
-    return user
+    current_user = AuthenticatedUser.model_validate(user)
+    # Never keep a token cached past its own expiry.
+    ttl = min(settings.AUTH_CACHE_TTL_SECONDS, payload["exp"] - time.time())
+    principal_cache.set(token, (current_user, generation), ttl)
+
+    return current_user
+
+
+async def stream_user(
+    db_session=Depends(get_db),
+    authorization: str | None = Header(None),
+    token: str | None = Query(None),
+):
+    """auth_user for long-lived streams.
+
+    Browsers cannot set headers on EventSource or WebSocket, so the token may
+    also come as ?token=. The session is closed before the stream starts so it
+    does not hold a pooled connection for the stream's lifetime.
+    """
+    if authorization is not None:
+        token = get_token(authorization)
+    if token is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    current_user = await auth_user(db_session, token)
+    await db_session.close()
+    return current_user
+
+
+def invalidate_user(connection, user_id: UUID):
+    bump_counters(connection, [principal_scope(user_id)])
+
+
+# Any flushed change to a user (role, region, trust) or its deletion bumps the
+# user's principal generation in the same transaction, which retires the
+# cached snapshots in every worker. Bulk update()/delete() statements bypass
+# these events and must call invalidate_user() themselves.
+@event.listens_for(User, "after_update")
+def _invalidate_updated_user(mapper, connection, target):
+    invalidate_user(connection, target.id)
+
 
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    invalidate_user(connection, target.id)
 
 
 def require_role(role: str):
-    def role_checker(current_user: User = Depends(auth_user)):
+    def role_checker(current_user: AuthenticatedUser = Depends(auth_user)):
         if current_user.role != role:
             raise HTTPException(status_code=403, detail="Insufficient permissions")
         return current_user
@@ -0,0 +1,474 @@
+"""In-process load benchmark for every API route.
+
+Seeds a synthetic dataset into a scratch SQLite database and media
+directory, drives the FastAPI app through httpx's ASGI transport with
+concurrent clients, and reports p50/p95/p99 latency, throughput and RSS
+growth per route.
+
+    python app/benchmark.py --scale 2 --output baseline.json
+    python app/benchmark.py --scale 2 --compare baseline.json
+
+The data is generated from --seed, so two runs at the same scale issue the
+same requests against the same rows. Compare mode exits 1 when a route's p95
+latency or throughput is worse than the baseline by more than --threshold.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SCENARIO_REQUESTS = 200
+
+# Per unit of --scale.
+USERS_PER_REGION = 5
+ARTIFACTS_PER_STATUS = 4
+RATINGS_PER_PUBLISHED = 3
+FILE_EVERY = 5
+TAGS = ["python", "sql", "cloud", "security", "ml", "devops", "frontend", "data", "api", "testing"]
+WORDS = (
+    "knowledge artifact review process delivery client practice governance region "
+    "consultant pattern migration platform strategy insight lesson design"
+).split()
+
+
+def configure(workdir: Path):
+    """Point settings at scratch storage; must run before the app is imported."""
+    from settings import settings
+
+    settings.DATABASE_URL = f"sqlite:///{workdir / 'bench.sqlite3'}"
+    settings.MEDIA_DIR = workdir / "uploads"
+    settings.BLOB_DIR = settings.MEDIA_DIR / "blobs"
+    settings.UPLOAD_TEMP_DIR = settings.MEDIA_DIR / "tmp"
+    settings.THUMBNAIL_DIR = settings.MEDIA_DIR / "thumbnails"
+    # Every simulated client shares one address; measure the routes, not the limiter.
+    settings.RATE_LIMIT_ENABLED = False
+    settings.MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+
+
+@dataclass
+class Dataset:
+    password: str
+    admin: object = None
+    champion: object = None
+    consultant: object = None
+    users: list = field(default_factory=list)
+    published: list = field(default_factory=list)
+    drafts: list = field(default_factory=list)
+    reviewable: list = field(default_factory=list)
+    files: list = field(default_factory=list)
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(scale: int, rng: random.Random) -> Dataset:
+    from sqlalchemy import insert
+
+    from auth import get_password_hash
+    from database import SessionLocal
+    from models import (
+        ArtifactReviewStatus,
+        ArtifactStatus,
+        ArtifactTag,
+        Blob,
+        KnowledgeArtifact,
+        Rating,
+        Region,
+        ReviewDecision,
+        SystemRole,
+        User,
+    )
+    from ratings import rebuild_rating_summaries
+    from search import rebuild_index
+    from storage import blob_path
+
+    data = Dataset(password="bench-password")
+    # One argon2 hash shared by every user keeps seeding fast.
+    password = get_password_hash(data.password)
+    now = datetime(2026, 1, 1)
+    roles = list(SystemRole)
+
+    def new_id():
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    users = []
+    for region in Region:
+        for index in range(USERS_PER_REGION * scale):
+            users.append({
+                "id": new_id(),
+                "name": f"{region.value.title()} {index}",
+                "email": f"{region.value.lower()}.{index}@bench.local",
+                "password": password,
+                "role": roles[index % len(roles)],
+                "region": region,
+                "is_trusted_contributor": index % 3 == 0,
+                "created_on": now,
+            })
+    data.users = users
+    data.consultant = next(user for user in users if user["role"] == SystemRole.CONSULTANT)
+    data.champion = next(user for user in users if user["role"] == SystemRole.KNOWLEDGE_CHAMPION)
+    data.admin = next(user for user in users if user["role"] == SystemRole.ADMIN)
+
+    artifacts, tags, reviews, ratings, blobs = [], [], [], [], {}
+    for user in users:
+        for status in ArtifactStatus:
+            for index in range(ARTIFACTS_PER_STATUS):
+                created_on = now - timedelta(minutes=len(artifacts))
+                artifact = {
+                    "id": new_id(),
+                    "title": _text(rng, 4).title(),
+                    "summary": _text(rng, 12),
+                    "content": _text(rng, 200),
+                    "status": status,
+                    "file": None,
+                    "file_sha256": None,
+                    "created_by": user["id"],
+                    "created_on": created_on,
+                    "last_updated": created_on,
+                }
+                if len(artifacts) % FILE_EVERY == 0:
+                    body = rng.randbytes(rng.randint(1024, 64 * 1024))
+                    sha256 = hashlib.sha256(body).hexdigest()
+                    path = blob_path(sha256)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(body)
+                    blobs[sha256] = {"sha256": sha256, "size": len(body), "ref_count": 1, "created_on": now}
+                    artifact["file"] = f"{artifact['id'].hex[:8]}.bin"
+                    artifact["file_sha256"] = sha256
+                    data.files.append(artifact)
+                artifacts.append(artifact)
+
+                tags.extend(
+                    {"id": new_id(), "artifact_id": artifact["id"], "tag": tag}
+                    for tag in rng.sample(TAGS, rng.randint(1, 3))
+                )
+
+                if status == ArtifactStatus.PUBLISHED:
+                    data.published.append(artifact)
+                    for rater in rng.sample(users, min(RATINGS_PER_PUBLISHED, len(users))):
+                        ratings.append({
+                            "id": new_id(),
+                            "artifact_id": artifact["id"],
+                            "user_id": rater["id"],
+                            "score": rng.randint(1, 5),
+                            "rated_on": created_on + timedelta(hours=rng.randint(1, 500)),
+                        })
+                elif status == ArtifactStatus.DRAFT:
+                    data.drafts.append(artifact)
+                else:
+                    decision = rng.choice([ReviewDecision.PENDING, ReviewDecision.SUBMITTED, ReviewDecision.CHANGES_REQUESTED])
+                    reviews.append({
+                        "id": new_id(),
+                        "artifact_id": artifact["id"],
+                        "decision": decision,
+                        "comments": None,
+                        "reviewed_by": None,
+                        "submitted_on": created_on,
+                    })
+                    data.reviewable.append(artifact)
+
+    with SessionLocal() as session:
+        for model, rows in (
+            (User, users),
+            (Blob, list(blobs.values())),
+            (KnowledgeArtifact, artifacts),
+            (ArtifactTag, tags),
+            (ArtifactReviewStatus, reviews),
+            (Rating, ratings),
+        ):
+            if rows:
+                session.execute(insert(model), rows)
+        session.commit()
+        rebuild_rating_summaries(session)
+        rebuild_index(session)
+
+    return data
+
+
+@dataclass
+class Scenario:
+    name: str
+    call: object
+    requests: int = SCENARIO_REQUESTS
+    expect: tuple = (200,)
+    # Later scenarios consume what this one creates, so --route never skips it.
+    prerequisite: bool = False
+
+
+def scenarios(data: Dataset, rng: random.Random) -> list[Scenario]:
+    from auth import create_access_token, create_refresh_token
+
+    def bearer(user):
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(user['id'])})}"}
+
+    consultant, champion, admin = bearer(data.consultant), bearer(data.champion), bearer(data.admin)
+    refresh_token = create_refresh_token({"sub": str(data.consultant["id"])})
+    published = [str(artifact["id"]) for artifact in data.published]
+    files = data.files
+
+    own_drafts = [str(artifact["id"]) for artifact in data.drafts if artifact["created_by"] == data.consultant["id"]]
+    reviewable = [str(artifact["id"]) for artifact in data.reviewable]
+    # Filled by the create scenario; review requests, publishes and deletes
+    # each consume their own artifacts from it.
+    created = []
+
+    def pick(values):
+        return values[rng.randrange(len(values))]
+
+    async def create(client, i):
+        response = await client.post(
+            "/api/create-artifact",
+            data={"title": f"Bench {i}", "summary": _text(rng, 12), "content": _text(rng, 200), "status": "DRAFT", "tags": "bench,python"},
+            files={"file": (f"bench-{i}.bin", rng.randbytes(4096))} if i % FILE_EVERY == 0 else None,
+            headers=consultant,
+        )
+        if response.status_code == 200:
+            created.append(response.json()["id"])
+        return response
+
+    def file_url(i):
+        artifact = files[i % len(files)]
+        return f"/api/blobs/{artifact['file_sha256']}/{artifact['file']}"
+
+    def legacy_file_url(i):
+        artifact = files[i % len(files)]
+        return f"/api/files/{artifact['created_by']}/artifacts/{artifact['file']}"
+
+    export_lines = []
+    import_ids = []
+
+    async def export(client, i):
+        response = await client.get("/api/export/artifacts", headers=admin)
+        if not export_lines:
+            export_lines.extend(response.text.splitlines(keepends=True)[:100])
+        return response
+
+    async def import_(client, i):
+        import_ids.append(f"bench-{i}")
+        return await client.post("/api/import/artifacts", params={"import_id": import_ids[-1]}, content="".join(export_lines), headers=admin)
+
+    return [
+        Scenario("POST /api/register", lambda client, i: client.post("/api/register", json={
+            "email": f"new.{i}@bench.local", "password": data.password, "name": f"New {i}", "role": "CONSULTANT", "region": "EUROPE",
+        }), requests=50),
+        Scenario("POST /api/login", lambda client, i: client.post("/api/login", json={
+            "email": pick(data.users)["email"], "password": data.password,
+        }), requests=50),
+        Scenario("POST /api/refresh-token", lambda client, i: client.post("/api/refresh-token", json={"refresh_token": refresh_token})),
+        Scenario("GET /api/profile", lambda client, i: client.get("/api/profile", headers=consultant)),
+        Scenario("GET /api/dashboard", lambda client, i: client.get("/api/dashboard", headers=consultant)),
+        Scenario("GET /api/artifacts", lambda client, i: client.get("/api/artifacts", params={"limit": 20})),
+        Scenario("GET /api/artifacts?tag", lambda client, i: client.get("/api/artifacts", params={"tag": rng.sample(TAGS, 2), "tag_mode": "any"})),
+        Scenario("GET /api/artifacts/tag-facets", lambda client, i: client.get("/api/artifacts/tag-facets", params={"tag": pick(TAGS)})),
+        Scenario("GET /api/artifacts/top-rated", lambda client, i: client.get("/api/artifacts/top-rated", params={"sort": "rating" if i % 2 else "trending"})),
+        Scenario("GET /api/search", lambda client, i: client.get("/api/search", params={"q": " ".join(rng.sample(WORDS, 2))})),
+        Scenario("GET /api/artifacts/my-artifacts", lambda client, i: client.get("/api/artifacts/my-artifacts", headers=consultant)),
+        Scenario("GET /api/artifacts/{artifact_id}", lambda client, i: client.get(f"/api/artifacts/{pick(published)}")),
+        Scenario("GET /api/artifacts/batch", lambda client, i: client.get("/api/artifacts/batch", params={"ids": rng.sample(published, min(20, len(published)))})),
+        Scenario("GET /api/blobs/{sha256}/{filename}", lambda client, i: client.get(file_url(i))),
+        Scenario("GET /api/files/{user_id}/{file_model_type}/{filename}", lambda client, i: client.get(legacy_file_url(i))),
+        Scenario("GET /api/review-requests", lambda client, i: client.get("/api/review-requests", headers=champion), requests=50),
+        Scenario("GET /api/review-queue", lambda client, i: client.get("/api/review-queue", headers=champion)),
+        Scenario("GET /api/review-queue/counts", lambda client, i: client.get("/api/review-queue/counts", headers=champion)),
+        Scenario("POST /api/create-artifact", create, prerequisite=True),
+        Scenario("PUT /api/artifacts/{artifact_id}", lambda client, i: client.put(f"/api/artifacts/{pick(own_drafts)}", data={
+            "title": f"Updated {i}", "summary": _text(rng, 12), "content": _text(rng, 200), "status": "DRAFT",
+        }, headers=consultant)),
+        Scenario("POST /api/request-review/{artifact_id}", lambda client, i: client.post(f"/api/request-review/{created.pop()}", headers=consultant), requests=50),
+        Scenario("POST /api/review-artifact/{artifact_id}", lambda client, i: client.post(f"/api/review-artifact/{pick(reviewable)}", json={
+            "decision": "CHANGES_REQUESTED", "comments": "bench",
+        }, headers=champion)),
+        Scenario("POST /api/review-artifacts", lambda client, i: client.post("/api/review-artifacts", json={"items": [
+            {"artifact_id": artifact_id, "decision": "CHANGES_REQUESTED", "comments": "bench"} for artifact_id in rng.sample(reviewable, min(10, len(reviewable)))
+        ]}, headers=champion)),
+        Scenario("POST /api/rate-artifact/{artifact_id}", lambda client, i: client.post(f"/api/rate-artifact/{pick(published)}", json={
+            "artifact_id": pick(published), "score": rng.randint(1, 5),
+        }, headers=consultant)),
+        Scenario("POST /api/rate-artifacts", lambda client, i: client.post("/api/rate-artifacts", json={"items": [
+            {"artifact_id": artifact_id, "score": rng.randint(1, 5)} for artifact_id in rng.sample(published, min(10, len(published)))
+        ]}, headers=consultant)),
+        Scenario("POST /api/publish-artifact/{artifact_id}", lambda client, i: client.post(f"/api/publish-artifact/{created.pop()}", headers=consultant), requests=50),
+        Scenario("DELETE /api/artifacts/{artifact_id}", lambda client, i: client.delete(f"/api/artifacts/{created.pop()}", headers=consultant), requests=50),
+        Scenario("GET /api/export/artifacts", export, requests=10, prerequisite=True),
+        Scenario("POST /api/import/artifacts", import_, requests=10, prerequisite=True),
+        Scenario("GET /api/import/artifacts/{import_id}", lambda client, i: client.get(f"/api/import/artifacts/{pick(import_ids)}", headers=admin)),
+    ]
+
+
+def rss_bytes() -> int:
+    """Current RSS where /proc has it; elsewhere the process peak, which only grows."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # ru_maxrss is KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak * (1 if sys.platform == "darwin" else 1024)
+
+
+class RssSampler:
+    """Largest RSS growth over the start of one route's run.
+
+    A thread samples RSS while the route runs, so memory it allocates and
+    releases again still counts, and growth left by earlier routes does not.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+    @property
+    def growth_mb(self) -> float:
+        return (self.peak - self.start) / (1024 * 1024)
+
+
+async def run_scenario(client, scenario: Scenario, concurrency: int, requests_scale: float) -> dict:
+    total = max(2, round(scenario.requests * requests_scale))
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            response = await scenario.call(client, index)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code not in scenario.expect:
+                errors += 1
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": total,
+        "errors": errors,
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "throughput_rps": total / elapsed,
+        "rss_growth_mb": rss.growth_mb,
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+
+    import migrations
+
+    migrations.upgrade()
+    rng = random.Random(args.seed)
+    data = seed(args.scale, rng)
+
+    import main
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for scenario in scenarios(data, rng):
+            selected = not args.route or any(pattern in scenario.name for pattern in args.route)
+            if not selected and not scenario.prerequisite:
+                continue
+            result = await run_scenario(client, scenario, args.concurrency, args.requests_scale)
+            if not selected:
+                continue
+            results[scenario.name] = result
+            print(
+                f"{scenario.name:55} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+                f"p99 {result['p99_ms']:8.2f}ms  {result['throughput_rps']:8.1f} req/s  "
+                f"rss +{result['rss_growth_mb']:6.1f}MB  errors {result['errors']}",
+                file=sys.stderr,
+            )
+
+    return {
+        "meta": {
+            "scale": args.scale,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests_scale": args.requests_scale,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "routes": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, result in current["routes"].items():
+        base = baseline["routes"].get(name)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {base['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every API route in-process.")
+    parser.add_argument("--scale", type=int, default=1, help="dataset size multiplier")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--requests-scale", type=float, default=1.0, help="multiplier for requests per route")
+    parser.add_argument("--route", action="append", help="only run routes containing this text")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="dkn-bench-") as workdir:
+        configure(Path(workdir))
+        results = asyncio.run(run(args))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("No regressions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
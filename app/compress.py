@@ -0,0 +1,285 @@
+"""Compression of artifact text at rest and of HTTP responses.
+
+At rest, CompressedText columns store values of TEXT_COMPRESSION_MIN_BYTES
+or more as MAGIC + codec id + compressed UTF-8. Anything without the header
+is read as plain text, so rows written before the column was compressed
+stay readable; `python app/compress.py recompress` rewrites them in batches.
+
+On the wire, responses are encoded as br (with the optional brotli package),
+zstd or gzip, as negotiated by Accept-Encoding. Cached JSON bodies are
+compressed once when cached (see responses.py); CompressionMiddleware
+handles everything else.
+"""
+import argparse
+import gzip
+import time
+import zlib
+
+from sqlalchemy import LargeBinary, literal, select, type_coerce, update
+from sqlalchemy.dialects.mysql import LONGBLOB
+from sqlalchemy.types import TypeDecorator
+from starlette.datastructures import Headers, MutableHeaders
+
+from settings import settings
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MAGIC = b"\x1fDK"
+
+# codec id byte -> (compress, decompress)
+TEXT_CODECS = {b"z": (zlib.compress, zlib.decompress)}
+if zstd is not None:
+    TEXT_CODECS[b"s"] = (zstd.compress, zstd.decompress)
+TEXT_CODEC_IDS = {"zlib": b"z", "zstd": b"s"}
+
+
+def _text_codec_id() -> bytes:
+    codec_id = TEXT_CODEC_IDS.get(settings.TEXT_COMPRESSION_CODEC)
+    if codec_id not in TEXT_CODECS:
+        raise ValueError(f"TEXT_COMPRESSION_CODEC {settings.TEXT_COMPRESSION_CODEC!r} is not available")
+    return codec_id
+
+
+def pack_text(value: str) -> bytes:
+    encoded = value.encode()
+    # Short values are left plain, unless they could be mistaken for a header.
+    if len(encoded) < settings.TEXT_COMPRESSION_MIN_BYTES and not encoded.startswith(MAGIC):
+        return encoded
+    codec_id = _text_codec_id()
+    return MAGIC + codec_id + TEXT_CODECS[codec_id][0](encoded)
+
+
+def unpack_text(value: bytes | str) -> str:
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        return value.decode()
+    codec_id = value[len(MAGIC):len(MAGIC) + 1]
+    return TEXT_CODECS[codec_id][1](value[len(MAGIC) + 1:]).decode()
+
+
+def is_packed(value: bytes | str | None, codec_id: bytes) -> bool:
+    """Whether a stored value is already in its final form for codec_id."""
+    if value is None:
+        return True
+    # Stored as text, from before the column was binary.
+    if isinstance(value, str):
+        return False
+    value = bytes(value)
+    if value.startswith(MAGIC):
+        return value[len(MAGIC):len(MAGIC) + 1] == codec_id
+    return len(value) < settings.TEXT_COMPRESSION_MIN_BYTES
+
+
+class CompressedText(TypeDecorator):
+    """Text stored compressed in a binary column; see the module docstring."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else pack_text(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else unpack_text(value)
+
+
+# Content codings in server preference order: name -> (compress, cached compress).
+# Cached bodies are compressed once, so they get the slower, smaller settings.
+CONTENT_CODINGS = {}
+if brotli is not None:
+    CONTENT_CODINGS["br"] = (
+        lambda body: brotli.compress(body, quality=4),
+        lambda body: brotli.compress(body, quality=11),
+    )
+if zstd is not None:
+    CONTENT_CODINGS["zstd"] = (
+        lambda body: zstd.compress(body, 3),
+        lambda body: zstd.compress(body, 19),
+    )
+CONTENT_CODINGS["gzip"] = (
+    lambda body: gzip.compress(body, 6, mtime=0),
+    lambda body: gzip.compress(body, 9, mtime=0),
+)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "image/svg+xml", "text/")
+UNCOMPRESSIBLE_TYPES = ("text/event-stream",)
+
+
+def negotiate(accept_encoding: str, available=CONTENT_CODINGS) -> str | None:
+    """The preferred content coding the client accepts, or None for identity."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    for coding in available:
+        if coding != "identity" and accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress_body(body: bytes, coding: str, cached: bool = False) -> bytes:
+    return CONTENT_CODINGS[coding][1 if cached else 0](body)
+
+
+def precompress(body: bytes) -> dict[str, bytes]:
+    """Every content coding of a body that is worth keeping, plus identity."""
+    bodies = {"identity": body}
+    if settings.RESPONSE_COMPRESSION_ENABLED and len(body) >= settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        for coding in CONTENT_CODINGS:
+            encoded = compress_body(body, coding, cached=True)
+            if len(encoded) < len(body):
+                bodies[coding] = encoded
+    return bodies
+
+
+def add_vary(headers: MutableHeaders):
+    vary = headers.get("vary", "")
+    if "accept-encoding" not in vary.lower():
+        headers["vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+
+
+def _compressible(headers: MutableHeaders, status: int) -> bool:
+    content_type = headers.get("content-type", "")
+    return (
+        status == 200
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith(UNCOMPRESSIBLE_TYPES)
+        and "content-range" not in headers
+    )
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing single-message response bodies.
+
+    Streamed bodies (exports, SSE, large files) and responses that already
+    carry a Content-Encoding pass through unchanged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            headers = MutableHeaders(raw=response_start["headers"])
+            body = message.get("body", b"")
+            if not message.get("more_body", False) and _compressible(headers, response_start["status"]):
+                add_vary(headers)
+                if (
+                    coding is not None
+                    and "content-encoding" not in headers
+                    and len(body) >= settings.RESPONSE_COMPRESSION_MIN_BYTES
+                ):
+                    encoded = compress_body(body, coding)
+                    if len(encoded) < len(body):
+                        body = encoded
+                        headers["content-encoding"] = coding
+                        headers["content-length"] = str(len(body))
+                        # The encoded bytes differ, so a strong validator
+                        # of the plain body becomes weak.
+                        etag = headers.get("etag")
+                        if etag and not etag.startswith("W/"):
+                            headers["etag"] = f"W/{etag}"
+                        message = {**message, "body": body}
+            await send(response_start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def recompress(bind, batch_size: int, pause: float = 0.0) -> tuple[int, int, int]:
+    """Rewrite stored artifact text not yet in the configured codec.
+
+    Works through the artifacts in primary-key batches, one short
+    transaction each, so it can run next to live traffic. Returns (rows
+    rewritten, bytes before, bytes after).
+    """
+    from models import KnowledgeArtifact
+
+    table = KnowledgeArtifact.__table__
+    columns = [column for column in table.columns if isinstance(column.type, CompressedText)]
+    codec_id = _text_codec_id()
+    rewritten = before = after = 0
+    last_id = None
+    while True:
+        with bind.begin() as connection:
+            query = select(table.c.id, *(type_coerce(column, LargeBinary).label(column.name) for column in columns))
+            if last_id is not None:
+                query = query.where(table.c.id > last_id)
+            rows = connection.execute(query.order_by(table.c.id).limit(batch_size)).all()
+            if not rows:
+                return rewritten, before, after
+
+            for row in rows:
+                values = {}
+                for column in columns:
+                    stored = getattr(row, column.name)
+                    if not is_packed(stored, codec_id):
+                        packed = pack_text(unpack_text(stored))
+                        values[column.name] = literal(packed, LargeBinary)
+                        before += len(stored.encode() if isinstance(stored, str) else stored)
+                        after += len(packed)
+                if values:
+                    connection.execute(update(table).where(table.c.id == row.id).values(**values))
+                    rewritten += 1
+            last_id = rows[-1].id
+        if pause:
+            time.sleep(pause)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress stored artifact text.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("recompress", help="rewrite rows not yet stored in TEXT_COMPRESSION_CODEC")
+    command.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE)
+    command.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    args = parser.parse_args(argv)
+
+    from database import engine
+
+    rewritten, before, after = recompress(engine, args.batch_size, args.pause)
+    print(f"Rewrote {rewritten} artifacts: {before} -> {after} bytes")
+
+
+if __name__ == "__main__":
+    main()
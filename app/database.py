@@ -1,19 +1,221 @@
-from sqlalchemy import create_engine
+import threading
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from metrics import CallbackMetric, instrument_engine, register
 from settings import settings
 
+# Sync DBAPI driver -> its asyncio counterpart, for the async engine.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+}
+
+
+class PoolWaitStats:
+    """How long connection checkouts waited on an engine's pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "total_wait_seconds": self.total_wait,
+                "max_wait_seconds": self.max_wait,
+                "average_wait_seconds": self.total_wait / self.checkouts if self.checkouts else 0.0,
+            }
+
+
+class _TimedPool:
+    # Mixed into the dialect's own pool class; _do_get blocks while the pool
+    # is exhausted, so its duration is the checkout wait.
+    wait_stats: PoolWaitStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.wait_stats.record(time.perf_counter() - started)
+
+
+def engine_options(url: str) -> tuple[dict, dict]:
+    """Return (create_engine kwargs, SQLite pragmas) for the configured profile."""
+    url = make_url(url)
+    profile = settings.DATABASE_PROFILE
+    if profile == "auto":
+        profile = url.get_backend_name()
+    options = dict(settings.DATABASE_PROFILES.get(profile, {}))
+    pragmas = options.pop("pragmas", {})
+
+    # A pool subclass per engine, so each keeps its own wait stats.
+    pool_class = url.get_dialect().get_pool_class(url)
+    options["poolclass"] = type(f"Timed{pool_class.__name__}", (_TimedPool, pool_class), {"wait_stats": PoolWaitStats()})
+    return options, pragmas
+
+
+def _set_pragmas(sync_engine, pragmas: dict):
+    if not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+_options, _pragmas = engine_options(settings.DATABASE_URL)
 engine = create_engine(
-    settings.DATABASE_URL
+    settings.DATABASE_URL,
+    **_options
 )
+_set_pragmas(engine, _pragmas)
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+
+def upsert(dialect_name: str, table, rows: list[dict], key: list[str], update):
+    """INSERT rows, updating the existing row on a conflict over key.
+
+    update(incoming) returns the column assignments for the update, where
+    incoming holds the values of the row that could not be inserted and the
+    table's own columns refer to the existing row.
+    """
+    if dialect_name == "mysql":
+        statement = mysql.insert(table).values(rows)
+        return statement.on_duplicate_key_update(update(statement.inserted))
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    statement = dialect.insert(table).values(rows)
+    return statement.on_conflict_do_update(index_elements=key, set_=update(statement.excluded))
+
+
+def async_database_url(url: str) -> str:
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.DATABASE_ASYNC:
+    _async_url = async_database_url(settings.DATABASE_URL)
+    _options, _pragmas = engine_options(_async_url)
+    async_engine = create_async_engine(
+        _async_url,
+        **_options
+    )
+    _set_pragmas(async_engine.sync_engine, _pragmas)
+    instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _pool_metric(key: str) -> dict:
+    engines = {"sync": engine, "async": async_engine}
+    return {(name,): bind.pool.wait_stats.stats()[key] for name, bind in engines.items() if bind is not None}
+
+
+def _pool_checked_out() -> dict:
+    engines = {"sync": engine, "async": async_engine}
+    return {(name,): bind.pool.checkedout() for name, bind in engines.items() if bind is not None and hasattr(bind.pool, "checkedout")}
+
+
+register(CallbackMetric(
+    "dkn_db_pool_checkouts_total", "Connection checkouts per engine.", ("engine",),
+    lambda: _pool_metric("checkouts"), type="counter",
+))
+register(CallbackMetric(
+    "dkn_db_pool_checkout_wait_seconds_total", "Time spent waiting for a pooled connection.", ("engine",),
+    lambda: _pool_metric("total_wait_seconds"), type="counter",
+))
+register(CallbackMetric(
+    "dkn_db_pool_checked_out", "Connections currently checked out.", ("engine",), _pool_checked_out,
+))
+
+
+class ThreadedSession:
+    """The subset of the AsyncSession API used by the routes, backed by a
+    sync Session whose blocking calls run in the threadpool.
+
+    It keeps handlers written once against the async API while the sync
+    engine stays selectable with DATABASE_ASYNC = False.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    db = ThreadedSession(SessionLocal(expire_on_commit=False))
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
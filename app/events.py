@@ -0,0 +1,237 @@
+"""In-process bus for review and publication events.
+
+Routes publish after their transaction commits; subscribers (SSE and
+WebSocket streams) receive the events they may see: their own artifacts',
+review traffic for reviewers, and publications for everyone.
+
+Each subscriber has a bounded buffer. One that falls behind is sent a
+"reset" event and disconnected rather than buffering without limit. Recent
+events are kept so a reconnecting client can resume from its Last-Event-ID;
+when that id is no longer available (too old, or from before a restart) it
+gets a "reset" event and should refetch its lists instead.
+
+Events published by a route only reach subscribers of that web process.
+The job worker runs apart from them, so it writes its events to the
+event_outbox table with enqueue(); every web process with subscribers
+relays the rows committed there into its own bus.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+
+from database import SessionLocal
+from metrics import CallbackMetric, register
+from models import OutboxEvent
+from settings import settings
+
+logger = logging.getLogger("dkn.events")
+
+REVIEW_REQUESTED = "review.requested"
+REVIEW_DECIDED = "review.decided"
+ARTIFACT_PUBLISHED = "artifact.published"
+ARTIFACT_RATED = "artifact.rated"
+ARTIFACT_PROCESSED = "artifact.processed"
+RESET = "reset"
+
+
+@dataclass(frozen=True)
+class Event:
+    id: str
+    type: str
+    data: dict = field(default_factory=dict)
+    owner_id: uuid.UUID | None = None
+    reviewers: bool = False
+    public: bool = False
+
+    def visible_to(self, subscription) -> bool:
+        return (
+            self.public
+            or self.owner_id == subscription.user_id
+            or (self.reviewers and subscription.reviewer)
+        )
+
+    def as_json(self) -> str:
+        return json.dumps({"id": self.id, "type": self.type, "data": self.data}, default=str)
+
+    def as_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+
+class Subscription:
+    def __init__(self, user_id: uuid.UUID, reviewer: bool, buffer_size: int):
+        self.user_id = user_id
+        self.reviewer = reviewer
+        self.queue = asyncio.Queue(buffer_size)
+        self.overflowed = False
+
+    def offer(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventBus:
+    def __init__(self, history_size: int, buffer_size: int):
+        self.buffer_size = buffer_size
+        # Ids are "<epoch>-<sequence>"; the epoch tells ids from before a
+        # restart apart from current ones.
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = itertools.count(1)
+        self._last_sequence = 0
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._relay = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, type: str, data: dict, owner_id=None, *, reviewers=False, public=False) -> Event:
+        with self._lock:
+            self._last_sequence = next(self._sequence)
+            event = Event(f"{self.epoch}-{self._last_sequence}", type, data, owner_id, reviewers, public)
+            self._history.append((self._last_sequence, event))
+
+        if self._loop is None:
+            return event
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(event)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, event)
+        return event
+
+    def _deliver(self, event: Event):
+        for subscription in list(self._subscribers):
+            if event.visible_to(subscription):
+                subscription.offer(event)
+
+    def _reset(self, reason: str) -> Event:
+        # Carries the newest id, so resuming from it skips nothing current.
+        return Event(f"{self.epoch}-{self._last_sequence}", RESET, {"reason": reason})
+
+    def replay(self, last_event_id: str, subscription: Subscription) -> list[Event]:
+        """Events after last_event_id visible to the subscriber, or a reset."""
+        epoch, _, sequence = last_event_id.partition("-")
+        with self._lock:
+            history = list(self._history)
+            last_sequence = self._last_sequence
+        if epoch != self.epoch or not sequence.isdigit() or int(sequence) > last_sequence:
+            return [self._reset("unknown event id")]
+
+        after = int(sequence)
+        oldest = history[0][0] if history else last_sequence + 1
+        if after + 1 < oldest:
+            return [self._reset("events expired")]
+        return [event for number, event in history if number > after and event.visible_to(subscription)]
+
+    @contextmanager
+    def subscribe(self, user_id: uuid.UUID, reviewer: bool):
+        self._loop = asyncio.get_running_loop()
+        if self._relay is None or self._relay.done() or self._relay.get_loop() is not self._loop:
+            self._relay = self._loop.create_task(relay_outbox(self))
+        subscription = Subscription(user_id, reviewer, self.buffer_size)
+        self._subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscribers.discard(subscription)
+
+    async def listen(self, user_id: uuid.UUID, reviewer: bool, last_event_id: str | None = None):
+        """Yield events for one subscriber, and None whenever a heartbeat is due.
+
+        Ends after a reset caused by the subscriber falling behind.
+        """
+        with self.subscribe(user_id, reviewer) as subscription:
+            if last_event_id:
+                for event in self.replay(last_event_id, subscription):
+                    yield event
+
+            while True:
+                if subscription.overflowed:
+                    yield self._reset("subscriber fell behind")
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+                except TimeoutError:
+                    yield None
+                    continue
+                yield event
+
+
+def enqueue(session, type: str, data: dict, owner_id=None, *, reviewers=False, public=False):
+    """Publish from outside the web processes, once the caller's transaction commits."""
+    session.add(OutboxEvent(
+        type=type,
+        data=json.dumps(data, default=str),
+        owner_id=owner_id,
+        reviewers=reviewers,
+        public=public,
+    ))
+
+
+def _read_outbox(after: int | None) -> tuple[int, list[OutboxEvent]]:
+    """Rows committed after id after, and the id to continue from."""
+    with SessionLocal(expire_on_commit=False) as session:
+        if after is None:
+            # A process relays only what is committed once it starts.
+            return session.scalar(select(func.max(OutboxEvent.id))) or 0, []
+
+        rows = session.scalars(select(OutboxEvent).where(OutboxEvent.id > after).order_by(OutboxEvent.id)).all()
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=settings.EVENTS_OUTBOX_RETENTION_SECONDS)
+        session.execute(delete(OutboxEvent).where(OutboxEvent.created_on < cutoff))
+        session.commit()
+        return (rows[-1].id if rows else after), rows
+
+
+async def relay_outbox(event_bus: "EventBus"):
+    after = None
+    while True:
+        try:
+            after, rows = await asyncio.to_thread(_read_outbox, after)
+        except Exception:
+            logger.exception("Reading the event outbox failed")
+        else:
+            for row in rows:
+                event_bus.publish(row.type, json.loads(row.data), row.owner_id, reviewers=row.reviewers, public=row.public)
+        await asyncio.sleep(settings.EVENTS_OUTBOX_POLL_SECONDS)
+
+
+bus = EventBus(settings.EVENTS_HISTORY_SIZE, settings.EVENTS_SUBSCRIBER_BUFFER)
+
+register(CallbackMetric(
+    "dkn_event_subscribers", "Open SSE and WebSocket event subscriptions.", (),
+    lambda: {(): bus.subscriber_count},
+))
+
+
+async def sse_stream(user_id: uuid.UUID, reviewer: bool, last_event_id: str | None):
+    yield f"retry: {settings.EVENTS_RETRY_MILLISECONDS}\n\n"
+    async for event in bus.listen(user_id, reviewer, last_event_id):
+        yield ": heartbeat\n\n" if event is None else event.as_sse()
+
+
+async def websocket_stream(websocket, user_id: uuid.UUID, reviewer: bool, last_event_id: str | None):
+    await websocket.accept()
+    async for event in bus.listen(user_id, reviewer, last_event_id):
+        if event is None:
+            await websocket.send_text(json.dumps({"type": "heartbeat", "time": time.time()}))
+        else:
+            await websocket.send_text(event.as_json())
+    await websocket.close()
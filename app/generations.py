@@ -0,0 +1,64 @@
+"""Counters that version cached responses across workers.
+
+Writes bump the counters of the responses they change inside their own
+transaction, and readers put the current values in their cache keys. A
+body cached from data read before a write keeps the old value in its key,
+so once the write commits no worker serves it again, however late it was
+filled and whichever process filled it.
+
+Published artifact bodies are keyed by KnowledgeArtifact.version; lists,
+tag facets, dashboards and authenticated users by rows of cache_generations.
+"""
+from sqlalchemy import select, update
+
+from database import upsert
+from models import CacheGeneration, KnowledgeArtifact
+
+# Published artifact list pages and tag facets.
+ARTIFACTS = "artifacts"
+
+
+def user_scope(user_id) -> str:
+    """The counter of one user's dashboard."""
+    return f"user:{user_id}"
+
+
+def principal_scope(user_id) -> str:
+    """The counter of one user's cached access tokens (role, region, existence)."""
+    return f"principal:{user_id}"
+
+
+def bump_counters(connection, names):
+    """Increment the named counters on connection; safe to call during a flush."""
+    table = CacheGeneration.__table__
+    # Sorted, so concurrent writers lock the counter rows in the same order.
+    rows = [{"name": name, "value": 1} for name in sorted(set(names))]
+    if rows:
+        connection.execute(upsert(
+            connection.dialect.name, table, rows, ["name"],
+            lambda incoming: {"value": table.c.value + 1},
+        ))
+
+
+def bump(session, names, artifact_ids=()):
+    """Increment the named counters and the version of each artifact, in the caller's transaction."""
+    bump_counters(session.connection(), names)
+
+    if artifact_ids:
+        artifacts = KnowledgeArtifact.__table__
+        session.execute(
+            update(artifacts)
+            .where(artifacts.c.id.in_(set(artifact_ids)))
+            .values(version=artifacts.c.version + 1)
+        )
+
+
+async def bump_generations(db, names, artifact_ids=()):
+    await db.run_sync(bump, names, artifact_ids)
+
+
+async def read_generations(db, *names) -> tuple:
+    """The current value of each named counter, 0 for one never bumped."""
+    table = CacheGeneration.__table__
+    values = dict((await db.execute(select(table.c.name, table.c.value).where(table.c.name.in_(names)))).all())
+    return tuple(values.get(name, 0) for name in names)
@@ -0,0 +1,330 @@
+"""Background processing of uploaded artifact files.
+
+Requests only enqueue a Job row in the same transaction as the artifact, so
+an upload returns as soon as its blob is durable. A worker then
+  * verifies the blob checksum,
+  * extracts plain text from text-like files for the search index,
+  * renders a thumbnail for images (when Pillow is installed), and
+  * writes a summary for artifacts created without one.
+
+    python app/jobs.py worker [--processes N] [--once]
+
+File work runs in a process pool; the worker process itself only claims
+jobs and applies their results. A claim is a lease: a job whose worker died
+becomes claimable again once JOB_LEASE_SECONDS pass, and failed attempts are
+retried with exponential backoff up to JOB_MAX_ATTEMPTS. A worker renews
+the leases of the jobs it is running and writes a job's progress, result or
+failure only while it still holds the lease, so a job claimed again by
+another worker is applied once. Every step can run again safely; results
+are written only while the artifact still has the file the job was created
+for.
+"""
+import argparse
+import hashlib
+import html
+import os
+import re
+import socket
+import tempfile
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import selectinload, undefer
+
+from database import SessionLocal
+import events
+from generations import ARTIFACTS, bump, user_scope
+from models import Job, JobState, KnowledgeArtifact
+from revisions import record_revision
+from search import index_artifact
+from settings import settings
+from storage import blob_path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PROCESS_UPLOAD = "process_upload"
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".csv", ".tsv", ".json", ".xml", ".yaml", ".yml", ".log", ".rst"}
+HTML_EXTENSIONS = {".html", ".htm"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"}
+
+_TAG = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class LeaseLost(Exception):
+    """The job was claimed by another worker after this one's lease lapsed."""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _held_by(worker_id: str):
+    return (Job.worker_id == worker_id) & (Job.state == JobState.RUNNING)
+
+
+def enqueue_upload_job(db, artifact):
+    """Queue post-processing for an artifact, inside the caller's transaction."""
+    db.add(Job(
+        kind=PROCESS_UPLOAD,
+        artifact_id=artifact.id,
+        file_sha256=artifact.file_sha256,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    ))
+
+
+def thumbnail_path(sha256: str) -> Path:
+    return settings.THUMBNAIL_DIR / sha256[:2] / f"{sha256}.png"
+
+
+def extract_text(path: Path, filename: str) -> str | None:
+    extension = Path(filename).suffix.lower()
+    if extension not in TEXT_EXTENSIONS | HTML_EXTENSIONS:
+        return None
+    with open(path, "rb") as file_object:
+        raw = file_object.read(settings.EXTRACTED_TEXT_MAX_CHARS * 4)
+    text = raw.decode("utf-8", errors="replace")
+    if extension in HTML_EXTENSIONS:
+        text = html.unescape(_TAG.sub(" ", text))
+    text = " ".join(text.split())
+    return text[:settings.EXTRACTED_TEXT_MAX_CHARS] or None
+
+
+def summarize(text: str) -> str:
+    """Leading sentences of text, cut at a word boundary to fit the limit."""
+    limit = settings.GENERATED_SUMMARY_CHARS
+    summary = ""
+    for sentence in _SENTENCE_END.split(" ".join(text.split())):
+        if len(summary) + len(sentence) + 1 > limit:
+            break
+        summary = f"{summary} {sentence}".strip()
+    if not summary:
+        summary = text[:limit].rsplit(" ", 1)[0].rstrip() + "…"
+    return summary
+
+
+def _write_thumbnail(path: Path, sha256: str) -> str | None:
+    if Image is None:
+        return None
+    target = thumbnail_path(sha256)
+    if target.exists():
+        return str(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with Image.open(path) as image:
+        image.thumbnail(settings.THUMBNAIL_SIZE)
+        fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix=".png")
+        with os.fdopen(fd, "wb") as file_object:
+            image.save(file_object, format="PNG")
+    os.replace(temp_path, target)
+    return str(target)
+
+
+def process_file(sha256: str, filename: str) -> dict:
+    """The CPU-bound part of a job; runs in a pool process."""
+    path = blob_path(sha256)
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_object:
+        while chunk := file_object.read(settings.UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    if digest.hexdigest() != sha256:
+        raise ValueError(f"Blob {sha256} is corrupt: checksum {digest.hexdigest()}")
+
+    extension = Path(filename).suffix.lower()
+    return {
+        "text": extract_text(path, filename),
+        "thumbnail": _write_thumbnail(path, sha256) if extension in IMAGE_EXTENSIONS else None,
+    }
+
+
+def claim_job(session, worker_id: str) -> Job | None:
+    """Lease the oldest runnable job; a conditional UPDATE settles races."""
+    now = _utcnow()
+    runnable = or_(
+        (Job.state == JobState.QUEUED) & (Job.run_after <= now),
+        (Job.state == JobState.RUNNING) & (Job.lease_expires_on < now),
+    )
+    candidates = session.scalars(select(Job.id).where(runnable).order_by(Job.run_after, Job.created_on).limit(10)).all()
+    for job_id in candidates:
+        claimed = session.execute(
+            update(Job)
+            .where(Job.id == job_id, runnable)
+            .values(
+                state=JobState.RUNNING,
+                worker_id=worker_id,
+                lease_expires_on=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                attempts=Job.attempts + 1,
+                step="claimed",
+                updated_on=now,
+            )
+        )
+        session.commit()
+        if claimed.rowcount == 1:
+            return session.get(Job, job_id, populate_existing=True)
+    return None
+
+
+def _set_step(session, job: Job, worker_id: str, step: str, progress: float):
+    now = _utcnow()
+    updated = session.execute(
+        update(Job)
+        .where(Job.id == job.id, _held_by(worker_id))
+        .values(
+            step=step,
+            progress=progress,
+            updated_on=now,
+            lease_expires_on=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+        )
+    )
+    session.commit()
+    if updated.rowcount != 1:
+        raise LeaseLost(job.id)
+
+
+def renew_leases(session, jobs, worker_id: str):
+    """Extend the leases this worker still holds on jobs it is running."""
+    now = _utcnow()
+    session.execute(
+        update(Job)
+        .where(Job.id.in_([job.id for job in jobs]), _held_by(worker_id))
+        .values(lease_expires_on=now + timedelta(seconds=settings.JOB_LEASE_SECONDS))
+    )
+    session.commit()
+
+
+def apply_result(session, job: Job, worker_id: str, result: dict | None):
+    # Finishing the job first settles a race with a worker that claimed it
+    # again: the row stays locked until the result below commits, and only
+    # the lease holder gets to apply it.
+    finished = session.execute(
+        update(Job)
+        .where(Job.id == job.id, _held_by(worker_id))
+        .values(
+            state=JobState.SUCCEEDED,
+            step="done",
+            progress=1.0,
+            last_error=None,
+            lease_expires_on=None,
+            updated_on=_utcnow(),
+        )
+    )
+    if finished.rowcount != 1:
+        session.rollback()
+        raise LeaseLost(job.id)
+
+    # Written like an update through the API: the row is locked first, and
+    # the change gets a revision, fresh cache versions and an event.
+    session.execute(select(KnowledgeArtifact.id).where(KnowledgeArtifact.id == job.artifact_id).with_for_update())
+    artifact = session.scalar(
+        select(KnowledgeArtifact)
+        .options(selectinload(KnowledgeArtifact.tags), undefer(KnowledgeArtifact.extracted_text))
+        .where(KnowledgeArtifact.id == job.artifact_id)
+        .execution_options(populate_existing=True)
+    )
+    # The file was replaced or removed since the job was queued; a newer job
+    # (if any) owns the artifact now.
+    if artifact is not None and artifact.file_sha256 == job.file_sha256:
+        previous = (artifact.title, artifact.summary, artifact.content)
+        if result is not None:
+            artifact.extracted_text = result["text"]
+        if not (artifact.summary or "").strip():
+            source = (result or {}).get("text") or artifact.content
+            if source and source.strip():
+                artifact.summary = summarize(source)
+        artifact.last_updated = datetime.now(timezone.utc)
+        record_revision(session, artifact, None, previous)
+        index_artifact(session, artifact)
+        bump(session, [ARTIFACTS, user_scope(artifact.created_by)], [artifact.id])
+        events.enqueue(session, events.ARTIFACT_PROCESSED, {
+            "artifact_id": artifact.id,
+            "job_id": job.id,
+            "summary": artifact.summary,
+        }, artifact.created_by)
+    session.commit()
+
+
+def fail_job(session, job: Job, worker_id: str, error: BaseException):
+    session.rollback()
+    job = session.get(Job, job.id, populate_existing=True, with_for_update=True)
+    if job is None or job.worker_id != worker_id or job.state != JobState.RUNNING:
+        session.rollback()
+        return
+    job.last_error = f"{type(error).__name__}: {error}"
+    job.lease_expires_on = None
+    job.updated_on = _utcnow()
+    if job.attempts >= job.max_attempts:
+        job.state = JobState.FAILED
+    else:
+        job.state = JobState.QUEUED
+        job.run_after = job.updated_on + timedelta(seconds=settings.JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+    session.commit()
+
+
+def _submit(session, pool, job: Job, worker_id: str):
+    """Start the file work for a claimed job; jobs without a file resolve at once."""
+    if not job.file_sha256:
+        future = Future()
+        future.set_result(None)
+        return future
+    filename = session.scalar(select(KnowledgeArtifact.file).where(KnowledgeArtifact.id == job.artifact_id))
+    _set_step(session, job, worker_id, "processing file", 0.2)
+    return pool.submit(process_file, job.file_sha256, filename or "")
+
+
+def work(processes: int, once: bool = False):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    with ProcessPoolExecutor(max_workers=processes) as pool, SessionLocal(expire_on_commit=False) as session:
+        in_flight = {}
+        renew_after = time.monotonic() + settings.JOB_LEASE_SECONDS / 3
+        while True:
+            while len(in_flight) < processes and (job := claim_job(session, worker_id)) is not None:
+                try:
+                    in_flight[_submit(session, pool, job, worker_id)] = job
+                except LeaseLost:
+                    pass
+                except Exception as e:
+                    fail_job(session, job, worker_id, e)
+
+            if not in_flight:
+                if once:
+                    return
+                time.sleep(settings.JOB_POLL_SECONDS)
+                continue
+
+            done, _ = wait(in_flight, timeout=settings.JOB_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = in_flight.pop(future)
+                try:
+                    result = future.result()
+                    _set_step(session, job, worker_id, "saving", 0.8)
+                    apply_result(session, job, worker_id, result)
+                except LeaseLost:
+                    pass
+                except Exception as e:
+                    fail_job(session, job, worker_id, e)
+
+            if in_flight and time.monotonic() >= renew_after:
+                renew_leases(session, in_flight.values(), worker_id)
+                renew_after = time.monotonic() + settings.JOB_LEASE_SECONDS / 3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process queued artifact jobs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker")
+    worker.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES)
+    worker.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    args = parser.parse_args(argv)
+
+    work(args.processes, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from router import router
-from database import Base, engine
-
-import models
+from compress import CompressionMiddleware
+from database import async_engine, engine
+from metrics import MetricsMiddleware, metrics_endpoint
+from migrations import check_schema
+import nplusone
+from search import init_search
+from settings import settings
+from storage import UploadLimitMiddleware
 
 
 app = FastAPI()
@@ -24,10 +29,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(UploadLimitMiddleware)
+
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+if settings.QUERY_AUDIT != "off":
+    nplusone.install(engine, *([async_engine.sync_engine] if async_engine is not None else []))
+    app.add_middleware(nplusone.QueryAuditMiddleware)
 
 app.include_router(router)
 
-Base.metadata.create_all(bind=engine)
+# Schema changes are applied by `python app/migrations.py upgrade`; workers
+# only verify the version so startup runs no DDL.
+check_schema(engine)
+init_search(engine)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,209 @@
+"""In-process metrics in the Prometheus text format.
+
+Observations only update a few counters under a lock. Nothing is formatted
+until /metrics is scraped, and callback gauges are read only then.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from fastapi.responses import Response
+from sqlalchemy import event
+
+from settings import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets or settings.METRICS_LATENCY_BUCKETS)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # One slot per bucket plus +Inf, then sum and count.
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), values):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {values[-2]}")
+            lines.append(f"{self.name}_count{suffix} {values[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+class CallbackMetric:
+    """A gauge or counter whose values are read from fn() at scrape time.
+
+    fn returns {label_values: value}; use an empty tuple without labels.
+    """
+
+    def __init__(self, name: str, help: str, labels: tuple, fn, type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.fn = fn
+        self.type = type
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for label_values, value in sorted(self.fn().items()):
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+request_seconds = register(Histogram(
+    "dkn_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+))
+request_sql_statements = register(Histogram(
+    "dkn_http_request_sql_statements",
+    "SQL statements executed per HTTP request.",
+    ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+))
+request_sql_seconds = register(Histogram(
+    "dkn_http_request_sql_seconds",
+    "Time spent in SQL statements per HTTP request.",
+    ("method", "route"),
+))
+sql_statement_seconds = register(Histogram(
+    "dkn_sql_statement_duration_seconds",
+    "Duration of individual SQL statements.",
+))
+password_hash_seconds = register(Histogram(
+    "dkn_password_hash_duration_seconds",
+    "Time spent hashing or verifying passwords with argon2.",
+))
+jwt_decode_seconds = register(Histogram(
+    "dkn_jwt_decode_duration_seconds",
+    "Time spent decoding and verifying JWTs.",
+))
+
+
+class RequestStats:
+    __slots__ = ("sql_statements", "sql_seconds")
+
+    def __init__(self):
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+# Shared with threadpool calls, which run in a copy of the request context.
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+        sql_statement_seconds.observe(elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.sql_statements += 1
+            stats.sql_seconds += elapsed
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            # Unmatched paths share one label so 404 scans cannot grow the series.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            request_seconds.observe(elapsed, method, route, status)
+            request_sql_statements.observe(stats.sql_statements, method, route)
+            request_sql_seconds.observe(stats.sql_seconds, method, route)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_endpoint(request):
+    return Response(content=render(), media_type=CONTENT_TYPE)
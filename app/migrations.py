@@ -0,0 +1,554 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in order, in its own transaction together with
+the schema_version row that records it. Every step is written to be safe on
+a database that already has some or all of its changes, so the first
+upgrade of a database created by the old create_all() converges too.
+
+    python app/migrations.py upgrade    # apply pending migrations
+    python app/migrations.py current    # print the applied version
+    python app/migrations.py check      # exit 1 unless up to date
+
+Workers only call check_schema() at startup, which reads one row and runs
+no DDL.
+"""
+import argparse
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import partial
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.schema import CreateColumn
+
+from database import engine
+from ratings import bayesian_average, trending_score
+from search import FIELD_WEIGHTS, FTS5_MARKERS, FTS5_TABLE, detect_backend, tokenize
+from tags import normalize_tag
+
+version_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_on", DateTime, nullable=False),
+)
+
+# The schema each migration creates is spelled out here rather than taken
+# from models.py, so a version builds the same tables whatever the models
+# look like when it runs. Later versions declare only the tables and
+# columns they add, plus the ones their foreign keys refer to.
+
+v1 = MetaData()
+
+Table(
+    "users",
+    v1,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("name", String(256), nullable=False),
+    Column("email", String(256), unique=True, nullable=False),
+    Column("password", String(256), nullable=False),
+    Column(
+        "role",
+        Enum("CONSULTANT", "KNOWLEDGE_CHAMPION", "GOVERNANCE_COUNCIL", "ADMIN", name="systemrole"),
+        nullable=False,
+    ),
+    Column(
+        "region",
+        Enum("AFRICA", "ASIA", "AUSTRALIA", "EUROPE", "NORTH_AMERICA", "SOUTH_AMERICA", name="region"),
+        nullable=False,
+    ),
+    Column("is_trusted_contributor", Boolean),
+    Column("created_on", DateTime),
+)
+
+Table(
+    "blobs",
+    v1,
+    Column("sha256", String(64), primary_key=True),
+    Column("size", BigInteger, nullable=False),
+    Column("ref_count", Integer, nullable=False),
+    Column("created_on", DateTime),
+)
+
+Table(
+    "artifacts",
+    v1,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("title", String(256), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("summary", Text),
+    Column(
+        "status",
+        Enum("DRAFT", "SUBMITTED", "APPROVED", "PUBLISHED", "CHANGES_REQUESTED", name="artifactstatus"),
+        nullable=False,
+    ),
+    Column("file", String(256)),
+    Column("file_sha256", String(64), ForeignKey("blobs.sha256"), nullable=True),
+    Column("created_by", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+    Column("created_on", DateTime),
+    Column("last_updated", DateTime),
+    Index("ix_artifacts_status_created_on_id", "status", "created_on", "id"),
+    Index("ix_artifacts_created_by_last_updated", "created_by", "last_updated"),
+)
+
+Table(
+    "artifact_tags",
+    v1,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), nullable=False),
+    Column("tag", String(256), nullable=False),
+    UniqueConstraint("artifact_id", "tag", name="uq_artifact_tags_artifact_id_tag"),
+    Index("ix_artifact_tags_tag_artifact_id", "tag", "artifact_id"),
+)
+
+Table(
+    "reviews",
+    v1,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), unique=True, nullable=False),
+    Column(
+        "decision",
+        Enum("PENDING", "SUBMITTED", "APPROVED", "CHANGES_REQUESTED", name="reviewdecision"),
+        nullable=False,
+    ),
+    Column("comments", Text, nullable=True),
+    Column("reviewed_by", UUID(as_uuid=True), ForeignKey("users.id"), nullable=True),
+    Column("submitted_on", DateTime),
+    Index("ix_reviews_decision_submitted_on_id", "decision", "submitted_on", "id"),
+)
+
+Table(
+    "ratings",
+    v1,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), nullable=False),
+    Column("user_id", UUID(as_uuid=True), ForeignKey("users.id"), nullable=False),
+    Column("score", Integer, nullable=False),
+    Column("rated_on", DateTime),
+    Index("ix_ratings_artifact_id", "artifact_id"),
+    Index("ix_ratings_user_id_artifact_id", "user_id", "artifact_id"),
+)
+
+Table(
+    "search_documents",
+    v1,
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), primary_key=True),
+    Column("length", Float, nullable=False),
+)
+
+Table(
+    "search_postings",
+    v1,
+    Column("term", String(64), primary_key=True),
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), primary_key=True, index=True),
+    Column("weight", Float, nullable=False),
+)
+
+Table(
+    "artifact_rating_summaries",
+    v1,
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), primary_key=True),
+    Column("rating_count", Integer, nullable=False),
+    Column("rating_sum", Integer, nullable=False),
+    Column("score_1", Integer, nullable=False),
+    Column("score_2", Integer, nullable=False),
+    Column("score_3", Integer, nullable=False),
+    Column("score_4", Integer, nullable=False),
+    Column("score_5", Integer, nullable=False),
+    Column("bayesian_average", Float, nullable=False, index=True),
+    Column("trending_score", Float, nullable=True, index=True),
+    Column("last_rated_on", DateTime, nullable=True),
+)
+
+Table(
+    "import_progress",
+    v1,
+    Column("import_id", String(128), primary_key=True),
+    Column("lines_done", Integer, nullable=False),
+    Column("imported", Integer, nullable=False),
+    Column("skipped", Integer, nullable=False),
+    Column("failed", Integer, nullable=False),
+    Column("finished", Boolean, nullable=False),
+    Column("updated_on", DateTime),
+)
+
+v5 = MetaData()
+
+Table(
+    "artifacts",
+    v5,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("extracted_text", Text, nullable=True),
+)
+
+Table(
+    "jobs",
+    v5,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("kind", String(64), nullable=False),
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), nullable=False, index=True),
+    Column("file_sha256", String(64), nullable=True),
+    Column("state", Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", name="jobstate"), nullable=False),
+    Column("step", String(64), nullable=True),
+    Column("progress", Float, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("max_attempts", Integer, nullable=False),
+    Column("last_error", Text, nullable=True),
+    Column("worker_id", String(128), nullable=True),
+    Column("lease_expires_on", DateTime, nullable=True),
+    Column("run_after", DateTime, nullable=False),
+    Column("created_on", DateTime),
+    Column("updated_on", DateTime),
+    Index("ix_jobs_state_run_after", "state", "run_after"),
+)
+
+v6 = MetaData()
+
+Table("users", v6, Column("id", UUID(as_uuid=True), primary_key=True))
+Table("artifacts", v6, Column("id", UUID(as_uuid=True), primary_key=True))
+
+Table(
+    "artifact_revisions",
+    v6,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("artifact_id", UUID(as_uuid=True), ForeignKey("artifacts.id"), nullable=False),
+    Column("number", Integer, nullable=False),
+    Column("title", String(256), nullable=False),
+    Column("summary", Text),
+    Column("is_snapshot", Boolean, nullable=False),
+    Column("payload", LargeBinary, nullable=False),
+    Column("content_size", Integer, nullable=False),
+    Column("content_sha256", String(64), nullable=False),
+    Column("created_by", UUID(as_uuid=True), ForeignKey("users.id"), nullable=True),
+    Column("created_on", DateTime),
+    UniqueConstraint("artifact_id", "number", name="uq_artifact_revisions_artifact_id_number"),
+)
+
+v8 = MetaData()
+
+Table(
+    "artifacts",
+    v8,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("version", Integer, server_default="1", nullable=False),
+)
+
+Table(
+    "cache_generations",
+    v8,
+    Column("name", String(128), primary_key=True),
+    Column("value", Integer, nullable=False),
+)
+
+v9 = MetaData()
+
+Table(
+    "event_outbox",
+    v9,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("type", String(64), nullable=False),
+    Column("data", Text, nullable=False),
+    Column("owner_id", UUID(as_uuid=True), nullable=True),
+    Column("reviewers", Boolean, nullable=False),
+    Column("public", Boolean, nullable=False),
+    Column("created_on", DateTime, nullable=False, index=True),
+)
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def create_index_online(connection, table: str, name: str, columns, unique: bool = False) -> bool:
+    """Create an index unless it exists; True if it was created.
+
+    On MySQL the index is built in place without locking the table, so
+    reads and writes continue during the build. SQLite has no online DDL;
+    its CREATE INDEX holds the write lock for the duration.
+    """
+    inspector = inspect(connection)
+    existing = {index["name"] for index in inspector.get_indexes(table)}
+    existing.update(constraint["name"] for constraint in inspector.get_unique_constraints(table))
+    if name in existing:
+        return False
+
+    quote = connection.dialect.identifier_preparer.quote
+    statement = (
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {quote(name)} ON {quote(table)} "
+        f"({', '.join(quote(column) for column in columns)})"
+    )
+    if connection.dialect.name == "mysql":
+        statement += " ALGORITHM=INPLACE LOCK=NONE"
+    connection.execute(text(statement))
+    return True
+
+
+def _create_tables_and_columns(metadata: MetaData, connection):
+    # New tables come with their indexes; tables that already exist only get
+    # the columns they are missing. Added columns are nullable or have a
+    # server default.
+    metadata.create_all(bind=connection)
+
+    inspector = inspect(connection)
+    for table in metadata.sorted_tables:
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {connection.dialect.identifier_preparer.quote(table.name)} ADD COLUMN {ddl}"))
+
+
+def _normalize_artifact_tags(connection):
+    # Tags are stored normalized since the facet work; older rows may differ
+    # only in case or spacing, which the unique index below would reject.
+    tags = v1.tables["artifact_tags"]
+    seen = set()
+    duplicates = []
+    for tag_id, artifact_id, tag in connection.execute(select(tags.c.id, tags.c.artifact_id, tags.c.tag).order_by(tags.c.id)):
+        normalized = normalize_tag(tag)
+        if not normalized or (artifact_id, normalized) in seen:
+            duplicates.append(tag_id)
+            continue
+        seen.add((artifact_id, normalized))
+        if normalized != tag:
+            connection.execute(tags.update().where(tags.c.id == tag_id).values(tag=normalized))
+
+    if duplicates:
+        connection.execute(tags.delete().where(tags.c.id.in_(duplicates)))
+
+    create_index_online(connection, "artifact_tags", "uq_artifact_tags_artifact_id_tag", ["artifact_id", "tag"], unique=True)
+
+
+def _create_production_indexes(connection):
+    for table in v1.sorted_tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            create_index_online(
+                connection,
+                table.name,
+                index.name,
+                [column.name for column in index.columns],
+                unique=bool(index.unique),
+            )
+
+
+def _backfill_search_index(connection):
+    # The fields indexed when this version was written; later changes to
+    # search.py reach existing rows through `python app/search.py`.
+    artifacts = v1.tables["artifacts"]
+    tags = v1.tables["artifact_tags"]
+    tags_by_artifact = defaultdict(list)
+    for artifact_id, tag in connection.execute(
+        select(tags.c.artifact_id, tags.c.tag)
+        .join(artifacts, artifacts.c.id == tags.c.artifact_id)
+        .where(artifacts.c.status == "PUBLISHED")
+        .order_by(tags.c.tag)
+    ):
+        tags_by_artifact[artifact_id].append(tag)
+
+    published = connection.execute(
+        select(artifacts.c.id, artifacts.c.title, artifacts.c.summary, artifacts.c.content)
+        .where(artifacts.c.status == "PUBLISHED")
+    ).all()
+    documents = [
+        (artifact_id, {
+            "title": title or "",
+            "summary": summary or "",
+            "content": content or "",
+            "tags": " ".join(tags_by_artifact[artifact_id]),
+        })
+        for artifact_id, title, summary, content in published
+    ]
+
+    if detect_backend(connection) == "fts5":
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS5_TABLE} USING fts5("
+            "artifact_id UNINDEXED, title, summary, content, tags, "
+            "tokenize = 'porter unicode61')"
+        ))
+        connection.execute(text(f"DELETE FROM {FTS5_TABLE}"))
+        if documents:
+            connection.execute(
+                text(
+                    f"INSERT INTO {FTS5_TABLE} (artifact_id, title, summary, content, tags) "
+                    "VALUES (:artifact_id, :title, :summary, :content, :tags)"
+                ),
+                [
+                    {"artifact_id": artifact_id.hex, **{field: value.translate(FTS5_MARKERS) for field, value in fields.items()}}
+                    for artifact_id, fields in documents
+                ],
+            )
+        return
+
+    search_documents = v1.tables["search_documents"]
+    search_postings = v1.tables["search_postings"]
+    connection.execute(search_postings.delete())
+    connection.execute(search_documents.delete())
+    for artifact_id, fields in documents:
+        weights = defaultdict(float)
+        length = 0.0
+        for field, value in fields.items():
+            tokens = tokenize(value)
+            length += FIELD_WEIGHTS[field] * len(tokens)
+            for token in tokens:
+                weights[token] += FIELD_WEIGHTS[field]
+        connection.execute(search_documents.insert().values(artifact_id=artifact_id, length=length))
+        if weights:
+            connection.execute(search_postings.insert(), [
+                {"term": term, "artifact_id": artifact_id, "weight": weight}
+                for term, weight in weights.items()
+            ])
+
+
+def _backfill_rating_summaries(connection):
+    ratings = v1.tables["ratings"]
+    summaries = v1.tables["artifact_rating_summaries"]
+    connection.execute(summaries.delete())
+
+    rows = {}
+    for artifact_id, score, rated_on in connection.execute(
+        select(ratings.c.artifact_id, ratings.c.score, ratings.c.rated_on)
+        .order_by(ratings.c.artifact_id, ratings.c.rated_on)
+    ):
+        row = rows.get(artifact_id)
+        if row is None:
+            row = rows[artifact_id] = {
+                "artifact_id": artifact_id,
+                "rating_count": 0,
+                "rating_sum": 0,
+                **{f"score_{value}": 0 for value in range(1, 6)},
+                "trending_score": None,
+                "last_rated_on": None,
+            }
+        row["rating_count"] += 1
+        row["rating_sum"] += score
+        row[f"score_{score}"] += 1
+        if rated_on is not None:
+            row["trending_score"] = trending_score(row["trending_score"], score, rated_on)
+            if row["last_rated_on"] is None or rated_on > row["last_rated_on"]:
+                row["last_rated_on"] = rated_on
+
+    for row in rows.values():
+        row["bayesian_average"] = bayesian_average(row["rating_count"], row["rating_sum"])
+    if rows:
+        connection.execute(summaries.insert(), list(rows.values()))
+
+
+def _backfill_search_and_ratings(connection):
+    _backfill_search_index(connection)
+    _backfill_rating_summaries(connection)
+
+
+def _compress_artifact_text(connection):
+    # SQLite stores the compressed bytes in the existing columns as they are;
+    # MySQL needs them binary. Existing rows stay plain text until
+    # `python app/compress.py recompress` rewrites them.
+    if connection.dialect.name == "mysql":
+        connection.execute(text(
+            "ALTER TABLE artifacts MODIFY content LONGBLOB NOT NULL, MODIFY extracted_text LONGBLOB NULL"
+        ))
+
+
+def _fill_missing_summaries(connection):
+    # Imports used to store lines without a summary as NULL, which every
+    # artifact response rejects.
+    connection.execute(text("UPDATE artifacts SET summary = '' WHERE summary IS NULL"))
+
+
+# (version, name, step); append new migrations, never reorder or edit old ones.
+MIGRATIONS = [
+    (1, "create tables and missing columns", partial(_create_tables_and_columns, v1)),
+    (2, "normalize artifact tags", _normalize_artifact_tags),
+    (3, "production indexes", _create_production_indexes),
+    (4, "backfill search index and rating summaries", _backfill_search_and_ratings),
+    (5, "upload processing jobs", partial(_create_tables_and_columns, v5)),
+    (6, "artifact revisions", partial(_create_tables_and_columns, v6)),
+    (7, "compressed artifact text", _compress_artifact_text),
+    (8, "cache generations", partial(_create_tables_and_columns, v8)),
+    (9, "event outbox", partial(_create_tables_and_columns, v9)),
+    (10, "empty summaries for imported artifacts", _fill_missing_summaries),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(connection) -> int:
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.scalar(select(schema_version.c.version).order_by(schema_version.c.version.desc()).limit(1)) or 0
+
+
+def upgrade(bind=engine, on_applied=None) -> int:
+    with bind.begin() as connection:
+        version_metadata.create_all(bind=connection)
+        version = current_version(connection)
+
+    for migration_version, name, step in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        with bind.begin() as connection:
+            step(connection)
+            connection.execute(schema_version.insert().values(
+                version=migration_version,
+                name=name,
+                applied_on=datetime.now(timezone.utc),
+            ))
+        version = migration_version
+        if on_applied is not None:
+            on_applied(migration_version, name)
+
+    return version
+
+
+def check_schema(bind=engine):
+    """Fail fast if the database has not been migrated to LATEST_VERSION."""
+    with bind.connect() as connection:
+        version = current_version(connection)
+    if version != LATEST_VERSION:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}; "
+            "run `python app/migrations.py upgrade`"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the database schema version.")
+    parser.add_argument("command", choices=["upgrade", "current", "check"])
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        version = upgrade(on_applied=lambda version, name: print(f"applied {version}: {name}"))
+        print(f"Schema is at version {version}")
+        return
+
+    with engine.connect() as connection:
+        version = current_version(connection)
+    print(f"Schema is at version {version} (latest {LATEST_VERSION})")
+    if args.command == "check" and version != LATEST_VERSION:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,16 @@ from sqlalchemy import (
     Text,
     ForeignKey,
     Integer,
+    BigInteger,
+    Float,
+    Index,
+    LargeBinary,
+    UniqueConstraint,
 )
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
+from compress import CompressedText
 from database import Base
 
 
@@ -40,6 +46,13 @@ class ReviewDecision(str, Enum):
     CHANGES_REQUESTED = "CHANGES_REQUESTED"
 
 
+class JobState(str, Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+
 class Region(str, Enum):
     AFRICA = "AFRICA"
     ASIA = "ASIA"
@@ -72,18 +85,49 @@ class KnowledgeArtifact(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String(256), nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(CompressedText, nullable=False)
     summary = Column(Text)
     status = Column(EnumField(ArtifactStatus), default=ArtifactStatus.DRAFT, nullable=False)
     file = Column(String(256))
+    file_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True)
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     last_updated = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Plain text extracted from the uploaded file by the job worker; only
+    # the search index reads it, so it is never loaded with the artifact.
+    extracted_text = deferred(Column(CompressedText, nullable=True))
+    # Incremented by every write that changes the artifact's response, in
+    # the same transaction; cached bodies are keyed by it (see generations.py).
+    version = Column(Integer, default=1, server_default="1", nullable=False)
 
     created_by_user = relationship("User", back_populates="artifacts")
-    tags = relationship("ArtifactTag", back_populates="artifact", cascade="all, delete-orphan")
+    tags = relationship("ArtifactTag", back_populates="artifact", cascade="all, delete-orphan", order_by="ArtifactTag.tag")
     ratings = relationship("Rating", back_populates="artifact", cascade="all, delete-orphan")
     review = relationship("ArtifactReviewStatus", back_populates="artifact", uselist=False, cascade="all, delete-orphan")
+    # Joined on every artifact load so responses carry ratings at no extra query.
+    rating_summary = relationship(
+        "ArtifactRatingSummary",
+        back_populates="artifact",
+        uselist=False,
+        lazy="joined",
+        cascade="all, delete-orphan",
+    )
+    jobs = relationship("Job", back_populates="artifact", cascade="all, delete-orphan")
+    revisions = relationship("ArtifactRevision", back_populates="artifact", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_artifacts_status_created_on_id", "status", "created_on", "id"),
+        Index("ix_artifacts_created_by_last_updated", "created_by", "last_updated"),
+    )
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 
 class ArtifactTag(Base):
@@ -95,6 +139,11 @@ class ArtifactTag(Base):
 
     artifact = relationship("KnowledgeArtifact", back_populates="tags")
 
+    __table_args__ = (
+        UniqueConstraint("artifact_id", "tag", name="uq_artifact_tags_artifact_id_tag"),
+        Index("ix_artifact_tags_tag_artifact_id", "tag", "artifact_id"),
+    )
+
 
 class ArtifactReviewStatus(Base):
     __tablename__ = "reviews"
@@ -109,6 +158,10 @@ class ArtifactReviewStatus(Base):
     artifact = relationship("KnowledgeArtifact", back_populates="review")
     reviewed_by_user = relationship("User", back_populates="reviews")
 
+    __table_args__ = (
+        Index("ix_reviews_decision_submitted_on_id", "decision", "submitted_on", "id"),
+    )
+
 
 class Rating(Base):
     __tablename__ = "ratings"
@@ -122,3 +175,130 @@ class Rating(Base):
     artifact = relationship("KnowledgeArtifact", back_populates="ratings")
     rated_by_user = relationship("User", back_populates="ratings")
 
+    __table_args__ = (
+        Index("ix_ratings_artifact_id", "artifact_id"),
+        Index("ix_ratings_user_id_artifact_id", "user_id", "artifact_id"),
+    )
+
+
+
+class SearchDocument(Base):
+    __tablename__ = "search_documents"
+
+    artifact_id = Column(UUID(as_uuid=True), ForeignKey("artifacts.id"), primary_key=True)
+    length = Column(Float, nullable=False)
+
+
+class SearchPosting(Base):
+    __tablename__ = "search_postings"
+
+    term = Column(String(64), primary_key=True)
+    artifact_id = Column(UUID(as_uuid=True), ForeignKey("artifacts.id"), primary_key=True, index=True)
+    weight = Column(Float, nullable=False)
+
+
+class ArtifactRatingSummary(Base):
+    __tablename__ = "artifact_rating_summaries"
+
+    artifact_id = Column(UUID(as_uuid=True), ForeignKey("artifacts.id"), primary_key=True)
+    rating_count = Column(Integer, default=0, nullable=False)
+    rating_sum = Column(Integer, default=0, nullable=False)
+    score_1 = Column(Integer, default=0, nullable=False)
+    score_2 = Column(Integer, default=0, nullable=False)
+    score_3 = Column(Integer, default=0, nullable=False)
+    score_4 = Column(Integer, default=0, nullable=False)
+    score_5 = Column(Integer, default=0, nullable=False)
+    bayesian_average = Column(Float, nullable=False, index=True)
+    trending_score = Column(Float, nullable=True, index=True)
+    last_rated_on = Column(DateTime, nullable=True)
+
+    artifact = relationship("KnowledgeArtifact", back_populates="rating_summary")
+
+    @property
+    def average(self) -> float | None:
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    @property
+    def histogram(self) -> dict[int, int]:
+        return {score: getattr(self, f"score_{score}") for score in range(1, 6)}
+
+
+class ImportProgress(Base):
+    __tablename__ = "import_progress"
+
+    import_id = Column(String(128), primary_key=True)
+    lines_done = Column(Integer, default=0, nullable=False)
+    imported = Column(Integer, default=0, nullable=False)
+    skipped = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    finished = Column(Boolean, default=False, nullable=False)
+    updated_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String(64), nullable=False)
+    artifact_id = Column(UUID(as_uuid=True), ForeignKey("artifacts.id"), nullable=False, index=True)
+    file_sha256 = Column(String(64), nullable=True)
+    state = Column(EnumField(JobState), default=JobState.QUEUED, nullable=False)
+    step = Column(String(64), nullable=True)
+    progress = Column(Float, default=0.0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+    last_error = Column(Text, nullable=True)
+    worker_id = Column(String(128), nullable=True)
+    lease_expires_on = Column(DateTime, nullable=True)
+    run_after = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    artifact = relationship("KnowledgeArtifact", back_populates="jobs")
+
+    __table_args__ = (
+        Index("ix_jobs_state_run_after", "state", "run_after"),
+    )
+
+
+class ArtifactRevision(Base):
+    __tablename__ = "artifact_revisions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    artifact_id = Column(UUID(as_uuid=True), ForeignKey("artifacts.id"), nullable=False)
+    number = Column(Integer, nullable=False)
+    title = Column(String(256), nullable=False)
+    summary = Column(Text)
+    # zlib-compressed: the full content for snapshots, otherwise a line delta
+    # against the previous revision's content (see revisions.py).
+    is_snapshot = Column(Boolean, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    content_size = Column(Integer, nullable=False)
+    content_sha256 = Column(String(64), nullable=False)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    artifact = relationship("KnowledgeArtifact", back_populates="revisions")
+
+    __table_args__ = (
+        UniqueConstraint("artifact_id", "number", name="uq_artifact_revisions_artifact_id_number"),
+    )
+
+
+class CacheGeneration(Base):
+    __tablename__ = "cache_generations"
+
+    name = Column(String(128), primary_key=True)
+    value = Column(Integer, nullable=False)
+
+
+class OutboxEvent(Base):
+    __tablename__ = "event_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    type = Column(String(64), nullable=False)
+    data = Column(Text, nullable=False)
+    owner_id = Column(UUID(as_uuid=True), nullable=True)
+    reviewers = Column(Boolean, default=False, nullable=False)
+    public = Column(Boolean, default=False, nullable=False)
+    created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
@@ -0,0 +1,147 @@
+"""N+1 and lazy-load detection for tests and staging.
+
+With QUERY_AUDIT set to "log" or "raise", every HTTP request is watched for
+  * the same SQL statement (same text, any parameters) run
+    QUERY_AUDIT_THRESHOLD or more times, and
+  * lazy loads of one relationship on QUERY_AUDIT_THRESHOLD or more rows,
+    which is a relationship being walked inside a loop.
+
+"log" writes a warning per finding when the request ends; "raise" fails the
+query that crosses the threshold with NPlusOneDetected. Findings are also
+collected per route template, for assertions in tests:
+
+    response = client.get("/api/artifacts/my-artifacts", headers=headers)
+    assert_clean("GET /api/artifacts/my-artifacts")
+"""
+import contextvars
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from settings import settings
+
+logger = logging.getLogger("dkn.nplusone")
+
+STATEMENT_PREVIEW = 200
+
+
+class NPlusOneDetected(Exception):
+    pass
+
+
+class RequestAudit:
+    __slots__ = ("statements", "lazy_loads", "findings")
+
+    def __init__(self):
+        self.statements = Counter()
+        self.lazy_loads = Counter()
+        self.findings = []
+
+    def _flag(self, finding: str):
+        self.findings.append(finding)
+        if settings.QUERY_AUDIT == "raise":
+            raise NPlusOneDetected(finding)
+
+    def record_statement(self, statement: str):
+        self.statements[statement] += 1
+        if self.statements[statement] == settings.QUERY_AUDIT_THRESHOLD:
+            preview = " ".join(statement.split())[:STATEMENT_PREVIEW]
+            self._flag(f"statement repeated {settings.QUERY_AUDIT_THRESHOLD}+ times: {preview}")
+
+    def record_lazy_load(self, relationship: str):
+        self.lazy_loads[relationship] += 1
+        if self.lazy_loads[relationship] == settings.QUERY_AUDIT_THRESHOLD:
+            self._flag(f"{relationship} lazy-loaded on {settings.QUERY_AUDIT_THRESHOLD}+ rows")
+
+
+@dataclass
+class RouteReport:
+    requests: int = 0
+    max_statements: int = 0
+    findings: Counter = field(default_factory=Counter)
+
+    @property
+    def clean(self) -> bool:
+        return not self.findings
+
+
+current_audit = contextvars.ContextVar("current_audit", default=None)
+
+_reports = {}
+_reports_lock = threading.Lock()
+
+
+def _on_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    audit = current_audit.get()
+    if audit is not None:
+        audit.record_statement(statement)
+
+
+def _on_orm_execute(orm_execute_state):
+    audit = current_audit.get()
+    if audit is not None and orm_execute_state.is_select and orm_execute_state.lazy_loaded_from is not None:
+        audit.record_lazy_load(str(orm_execute_state.loader_strategy_path[-1]))
+
+
+def install(*sync_engines):
+    """Attach the listeners; nothing is hooked while QUERY_AUDIT is "off"."""
+    for sync_engine in sync_engines:
+        event.listen(sync_engine, "before_cursor_execute", _on_cursor_execute)
+    event.listen(Session, "do_orm_execute", _on_orm_execute)
+
+
+def _record(route: str, audit: RequestAudit):
+    with _reports_lock:
+        report = _reports.setdefault(route, RouteReport())
+        report.requests += 1
+        report.max_statements = max(report.max_statements, sum(audit.statements.values()))
+        report.findings.update(audit.findings)
+
+    if settings.QUERY_AUDIT == "log":
+        for finding in audit.findings:
+            logger.warning("%s: %s", route, finding)
+
+
+def route_report(route: str) -> RouteReport:
+    with _reports_lock:
+        return _reports.get(route, RouteReport())
+
+
+def reports() -> dict[str, RouteReport]:
+    with _reports_lock:
+        return dict(_reports)
+
+
+def reset_reports():
+    with _reports_lock:
+        _reports.clear()
+
+
+def assert_clean(route: str):
+    report = route_report(route)
+    assert report.clean, f"N+1 queries on {route}: " + "; ".join(report.findings)
+
+
+class QueryAuditMiddleware:
+    """Pure ASGI middleware giving each HTTP request its own RequestAudit."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        audit = RequestAudit()
+        token = current_audit.set(audit)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_audit.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            _record(f"{scope['method']} {route}", audit)
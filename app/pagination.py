@@ -0,0 +1,43 @@
+import base64
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(position: datetime, row_id: UUID) -> str:
+    raw = f"{position.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        position, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(position), UUID(row_id)
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_filter(position_column, id_column, cursor: str, descending: bool = True):
+    # Rows strictly after the cursor in (position, id) order, so that ties on
+    # the position column are broken by id and no row is skipped or repeated.
+    position, row_id = decode_cursor(cursor)
+    if descending:
+        return or_(
+            position_column < position,
+            and_(position_column == position, id_column < row_id),
+        )
+    return or_(
+        position_column > position,
+        and_(position_column == position, id_column > row_id),
+    )
+
+
+def paginate(rows: list, limit: int, key) -> tuple[list, str | None]:
+    # Callers fetch limit + 1 rows; the extra row only signals another page.
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(*key(items[-1]))
+    return items, next_cursor
@@ -0,0 +1,170 @@
+"""Token-bucket admission control for the CPU-heavy auth routes.
+
+Each (route, scope, key) has a bucket of `burst` tokens that refills at the
+configured requests per minute. Buckets live in process memory by default;
+with RATE_LIMIT_BACKEND = "sqlite" they are kept in a small SQLite file so
+that every worker on the host draws from the same buckets.
+"""
+import math
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+
+from metrics import CallbackMetric, register
+from settings import settings
+
+
+def _refill(tokens: float, updated: float, now: float, per_second: float, burst: int) -> float:
+    return min(burst, tokens + (now - updated) * per_second)
+
+
+def _retry_after(tokens: float, per_second: float) -> float:
+    return (1 - tokens) / per_second
+
+
+class MemoryBackend:
+    blocking = False
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, per_second: float, burst: int) -> float:
+        """Take one token; returns 0 on success, else seconds until one is free."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, updated, now, per_second, burst)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = _retry_after(tokens, per_second)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Dropping the least recently used bucket only ever hands a
+            # client a full bucket again.
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    blocking = True
+
+    # Buckets idle this long are full again and can be deleted.
+    PRUNE_AFTER_SECONDS = 24 * 60 * 60
+    PRUNE_PROBABILITY = 0.001
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, per_second: float, burst: int) -> float:
+        # Wall-clock time, since the buckets are shared between processes.
+        now = time.time()
+        key = "\x1f".join(key)
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else _refill(row[0], row[1], now, per_second, burst)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = _retry_after(tokens, per_second)
+            connection.execute(
+                "INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            if random.random() < self.PRUNE_PROBABILITY:
+                connection.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self.PRUNE_AFTER_SECONDS,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+    def clear(self):
+        self._connect().execute("DELETE FROM rate_buckets")
+
+
+def _create_backend():
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryBackend(settings.RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND {settings.RATE_LIMIT_BACKEND!r}")
+
+
+backend = _create_backend()
+
+_rejected = Counter()
+_rejected_lock = threading.Lock()
+
+register(CallbackMetric(
+    "dkn_rate_limited_total", "Requests rejected by a rate limit.", ("route", "scope"),
+    lambda: dict(_rejected), type="counter",
+))
+
+
+def client_ip(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def check(route: str, scope: str, key: str) -> float:
+    """Take a token from the route's bucket for key; 0 means admitted."""
+    limit = settings.RATE_LIMITS.get(route, {}).get(scope)
+    if not settings.RATE_LIMIT_ENABLED or limit is None:
+        return 0.0
+
+    per_minute, burst = limit
+    bucket = (route, scope, key)
+    if backend.blocking:
+        wait = await run_in_threadpool(backend.take, bucket, per_minute / 60, burst)
+    else:
+        wait = backend.take(bucket, per_minute / 60, burst)
+
+    if wait:
+        with _rejected_lock:
+            _rejected[(route, scope)] += 1
+    return wait
+
+
+def too_many_requests(retry_after: float) -> Response:
+    return Response(
+        content="Too many requests",
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
@@ -0,0 +1,144 @@
+import math
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from database import upsert
+from models import ArtifactRatingSummary, Rating
+from settings import settings
+
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def bayesian_average(rating_count: int, rating_sum: int) -> float:
+    prior = settings.RATING_PRIOR_WEIGHT
+    return (prior * settings.RATING_PRIOR_MEAN + rating_sum) / (prior + rating_count)
+
+
+def _log2_add(a: float | None, b: float) -> float:
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def trending_score(current: float | None, score: int, rated_on: datetime) -> float:
+    """Fold one rating into an exponentially decaying trending score.
+
+    The score is log2 of sum(score_i * 2 ** (t_i / half_life)) over all
+    ratings. Decaying every artifact to "now" divides each sum by the same
+    factor, so the stored value ranks correctly at any time, can be indexed,
+    and never needs a periodic recompute.
+    """
+    if rated_on.tzinfo is None:
+        rated_on = rated_on.replace(tzinfo=timezone.utc)
+    half_lives = (rated_on - TRENDING_EPOCH).total_seconds() / 3600 / settings.TRENDING_HALF_LIFE_HOURS
+    return _log2_add(current, half_lives + math.log2(score))
+
+
+def _new_summary(artifact_id) -> ArtifactRatingSummary:
+    return ArtifactRatingSummary(
+        artifact_id=artifact_id,
+        rating_count=0,
+        rating_sum=0,
+        score_1=0,
+        score_2=0,
+        score_3=0,
+        score_4=0,
+        score_5=0,
+        bayesian_average=bayesian_average(0, 0),
+    )
+
+
+def _apply(summary: ArtifactRatingSummary, score: int, rated_on: datetime):
+    summary.rating_count += 1
+    summary.rating_sum += score
+    setattr(summary, f"score_{score}", getattr(summary, f"score_{score}") + 1)
+    summary.bayesian_average = bayesian_average(summary.rating_count, summary.rating_sum)
+    summary.trending_score = trending_score(summary.trending_score, score, rated_on)
+    if summary.last_rated_on is None or rated_on > summary.last_rated_on:
+        summary.last_rated_on = rated_on
+
+
+def summarize_ratings(artifact_id, ratings) -> ArtifactRatingSummary:
+    """Build a summary from (score, rated_on) pairs given in rated_on order."""
+    summary = _new_summary(artifact_id)
+    for score, rated_on in ratings:
+        _apply(summary, score, rated_on)
+    return summary
+
+
+COUNTERS = ("rating_count", "rating_sum", "score_1", "score_2", "score_3", "score_4", "score_5")
+
+
+async def record_rating(db, rating: Rating):
+    """Fold a new rating into its artifact's summary, in the caller's transaction."""
+    await record_ratings(db, [rating])
+
+
+async def record_ratings(db, ratings: list[Rating]):
+    """Fold new ratings into their summaries, in the caller's transaction."""
+    await db.run_sync(_record_ratings, ratings)
+
+
+def _record_ratings(session, ratings: list[Rating]):
+    totals = {}
+    for rating in ratings:
+        row = totals.setdefault(rating.artifact_id, {"artifact_id": rating.artifact_id, **dict.fromkeys(COUNTERS, 0)})
+        row["rating_count"] += 1
+        row["rating_sum"] += rating.score
+        row[f"score_{rating.score}"] += 1
+    for row in totals.values():
+        row["bayesian_average"] = bayesian_average(row["rating_count"], row["rating_sum"])
+
+    # The counters are added in the database, so concurrent ratings cannot
+    # overwrite each other, and the write locks the summaries until commit.
+    table = ArtifactRatingSummary.__table__
+    session.execute(upsert(
+        session.get_bind().dialect.name, table, list(totals.values()), ["artifact_id"],
+        lambda incoming: {name: table.c[name] + incoming[name] for name in COUNTERS},
+    ))
+
+    # The rest derives from the stored counts, read back under that lock.
+    summaries = {
+        summary.artifact_id: summary
+        for summary in session.scalars(
+            select(ArtifactRatingSummary)
+            .where(ArtifactRatingSummary.artifact_id.in_(totals))
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+    }
+    for rating in ratings:
+        summary = summaries[rating.artifact_id]
+        rated_on = (rating.rated_on or datetime.now(timezone.utc)).replace(tzinfo=None)
+        summary.trending_score = trending_score(summary.trending_score, rating.score, rated_on)
+        if summary.last_rated_on is None or rated_on > summary.last_rated_on:
+            summary.last_rated_on = rated_on
+    for summary in summaries.values():
+        summary.bayesian_average = bayesian_average(summary.rating_count, summary.rating_sum)
+
+
+def rebuild_rating_summaries(session):
+    """Recompute every summary from the raw ratings table."""
+    session.query(ArtifactRatingSummary).delete(synchronize_session=False)
+
+    summary = None
+    ratings = session.query(Rating.artifact_id, Rating.score, Rating.rated_on).order_by(
+        Rating.artifact_id, Rating.rated_on
+    )
+    for artifact_id, score, rated_on in ratings.yield_per(1000):
+        if summary is None or summary.artifact_id != artifact_id:
+            summary = _new_summary(artifact_id)
+            session.add(summary)
+        _apply(summary, score, rated_on)
+
+    session.commit()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    with SessionLocal() as db_session:
+        rebuild_rating_summaries(db_session)
+    print("Rating summaries rebuilt")
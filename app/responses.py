@@ -0,0 +1,51 @@
+import hashlib
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from cache import SizedLRUCache
+from compress import negotiate, precompress
+from settings import settings
+from storage import REVALIDATE_CACHE_CONTROL, etag_matches
+
+# key -> (etag, {content coding: JSON bytes}). Bodies are compressed once,
+# when cached. Published artifacts are keyed by ("artifact", id, version)
+# and list pages by ("list", generation, ...); see generations.py.
+response_cache = SizedLRUCache(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+
+def cache_body(key, body: bytes) -> tuple[str, dict[str, bytes]]:
+    """Keep an already serialized JSON body, with an ETag over it."""
+    bodies = precompress(body)
+    entry = (f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', bodies)
+    response_cache.set(key, entry, sum(len(encoded) for encoded in bodies.values()))
+    return entry
+
+
+def cache_json(key, model: BaseModel) -> tuple[str, dict[str, bytes]]:
+    return cache_body(key, model.model_dump_json().encode())
+
+
+def json_response(request: Request, entry: tuple[str, dict[str, bytes]]) -> Response:
+    etag, bodies = entry
+    coding = negotiate(request.headers.get("accept-encoding", ""), bodies)
+    headers = {
+        # Encoded variants have other bytes, so their validator is weak.
+        "etag": etag if coding is None else f"W/{etag}",
+        "cache-control": REVALIDATE_CACHE_CONTROL,
+        "vary": "Accept-Encoding",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if coding is not None:
+        headers["content-encoding"] = coding
+    return Response(content=bodies[coding or "identity"], media_type="application/json", headers=headers)
+
+
+def evict_artifact(artifact_id=None):
+    """Drop an artifact's cached body and every cached list page."""
+    response_cache.discard_keys(
+        lambda key: key[0] == "list" or (key[0] == "artifact" and key[1] == artifact_id)
+    )
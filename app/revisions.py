@@ -0,0 +1,166 @@
+"""Revision history of artifact title, summary and content.
+
+Each revision stores its content zlib-compressed, either in full (a
+snapshot) or as a line delta against the previous revision. Snapshots are
+taken every REVISION_SNAPSHOT_INTERVAL revisions, so reading any revision
+decompresses one snapshot and applies a bounded number of deltas.
+
+A delta is a JSON list of operations: [start, end] copies those lines of
+the previous content, a string inserts new text.
+"""
+import difflib
+import hashlib
+import json
+import zlib
+
+from sqlalchemy import func, select
+
+from models import ArtifactRevision
+from settings import settings
+
+
+class RevisionCorrupted(RuntimeError):
+    pass
+
+
+def encode_delta(old: str, new: str) -> bytes:
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    operations = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            operations.append([i1, i2])
+        elif j2 > j1:
+            operations.append("".join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(operations, separators=(",", ":")).encode())
+
+
+def apply_delta(old: str, payload: bytes) -> str:
+    old_lines = old.splitlines(keepends=True)
+    return "".join(
+        operation if isinstance(operation, str) else "".join(old_lines[operation[0]:operation[1]])
+        for operation in json.loads(zlib.decompress(payload))
+    )
+
+
+def _new_revision(artifact_id, number: int, title: str, summary: str | None, content: str, author_id, base: str | None):
+    encoded = content.encode()
+    payload = zlib.compress(encoded)
+    is_snapshot = base is None
+    if not is_snapshot:
+        delta = encode_delta(base, content)
+        # A rewrite can make the delta bigger than the content itself.
+        if len(delta) < len(payload):
+            payload = delta
+        else:
+            is_snapshot = True
+
+    return ArtifactRevision(
+        artifact_id=artifact_id,
+        number=number,
+        title=title,
+        summary=summary,
+        is_snapshot=is_snapshot,
+        payload=payload,
+        content_size=len(encoded),
+        content_sha256=hashlib.sha256(encoded).hexdigest(),
+        created_by=author_id,
+    )
+
+
+def record_revision(session, artifact, author_id, previous: tuple | None = None):
+    """Store the artifact's title, summary and content as its next revision.
+
+    Runs inside the caller's transaction. previous is the (title, summary,
+    content) the artifact had before the change, or None for a new artifact.
+    """
+    current = (artifact.title, artifact.summary, artifact.content)
+    if previous == current:
+        return None
+
+    # Writing the artifact first holds its row (or SQLite's write lock) until
+    # commit, so concurrent updates record their revisions one at a time.
+    session.flush()
+    latest = session.scalars(
+        select(ArtifactRevision)
+        .where(ArtifactRevision.artifact_id == artifact.id)
+        .order_by(ArtifactRevision.number.desc())
+        .limit(1)
+        .with_for_update()
+    ).first()
+
+    base = None
+    if latest is None and previous is not None:
+        # The artifact predates revision history; its prior state becomes
+        # the first revision.
+        latest = _new_revision(artifact.id, 1, *previous, artifact.created_by, None)
+        session.add(latest)
+        base = previous[2]
+    elif latest is not None:
+        # Deltas are taken against the stored content, which a concurrent
+        # update may have moved past the previous state this request saw.
+        if previous is not None and hashlib.sha256(previous[2].encode()).hexdigest() == latest.content_sha256:
+            base = previous[2]
+        else:
+            base = load_revision(session, artifact.id, latest.number)[1]
+        if (latest.title, latest.summary, base) == current:
+            return None
+
+    number = 1 if latest is None else latest.number + 1
+    snapshot = base is None or (number - 1) % settings.REVISION_SNAPSHOT_INTERVAL == 0
+    revision = _new_revision(artifact.id, number, *current, author_id, None if snapshot else base)
+    session.add(revision)
+    return revision
+
+
+def load_revision(session, artifact_id, number: int):
+    """Return (revision, content) for one revision, or None if it does not exist."""
+    base = session.scalar(
+        select(func.max(ArtifactRevision.number))
+        .where(ArtifactRevision.artifact_id == artifact_id)
+        .where(ArtifactRevision.is_snapshot.is_(True), ArtifactRevision.number <= number)
+    )
+    if base is None:
+        return None
+
+    chain = session.scalars(
+        select(ArtifactRevision)
+        .where(ArtifactRevision.artifact_id == artifact_id)
+        .where(ArtifactRevision.number.between(base, number))
+        .order_by(ArtifactRevision.number)
+    ).all()
+    if not chain or chain[-1].number != number:
+        return None
+
+    content = None
+    for revision in chain:
+        if revision.is_snapshot:
+            content = zlib.decompress(revision.payload).decode()
+        else:
+            content = apply_delta(content, revision.payload)
+
+    if hashlib.sha256(content.encode()).hexdigest() != chain[-1].content_sha256:
+        raise RevisionCorrupted(f"Revision {number} of artifact {artifact_id} does not match its checksum")
+    return chain[-1], content
+
+
+def _diff_lines(text: str | None) -> list[str]:
+    return [line if line.endswith("\n") else line + "\n" for line in (text or "").splitlines(keepends=True)]
+
+
+def diff_revisions(old: ArtifactRevision, old_content: str, new: ArtifactRevision, new_content: str) -> str:
+    """A unified diff with one section per changed field."""
+    sections = (
+        ("title", old.title, new.title),
+        ("summary", old.summary, new.summary),
+        ("content", old_content, new_content),
+    )
+    return "".join(
+        "".join(difflib.unified_diff(
+            _diff_lines(before),
+            _diff_lines(after),
+            f"a/{name} (revision {old.number})",
+            f"b/{name} (revision {new.number})",
+        ))
+        for name, before, after in sections
+    )
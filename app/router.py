@@ -1,37 +1,92 @@
 import os
+import tempfile
 import uuid
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse, Response
-from sqlalchemy.orm import joinedload
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import contains_eager, joinedload, load_only, selectinload
 
+from cache import TTLCache
 from database import get_db
+import events
+from generations import ARTIFACTS, bump_generations, read_generations, user_scope
+from jobs import enqueue_upload_job, thumbnail_path
+from pagination import keyset_filter, paginate
+import ratelimit
+from ratings import record_rating, record_ratings
+from responses import cache_body, cache_json, evict_artifact, json_response, response_cache
+from serializers import (
+    artifact_page_adapter,
+    artifact_rows,
+    dump_artifacts,
+    list_item_json,
+    list_item_rows,
+    load_tags,
+)
+from revisions import diff_revisions, load_revision, record_revision
+from search import index_artifact, remove_artifact, search_artifacts
+from tags import facet_query, normalize_tags, set_tags, tag_filter
+from transfer import export_lines, import_file
+from storage import (
+    blob_path,
+    file_response,
+    release_reference,
+    remove_orphan,
+    save_upload,
+    stat_cache,
+)
 from settings import settings
 from models import (
     ReviewDecision,
     ArtifactStatus,
     ArtifactReviewStatus,
     SystemRole,
+    Region,
     User,
     KnowledgeArtifact, 
+    ArtifactRatingSummary,
     Rating,
-   
+    ImportProgress,
+    Job,
+    ArtifactRevision,
 )
 from schemas import (
+    AuthenticatedUser,
     UserForm, 
     UserResponse,
     LoginForm,
     TokenResponse,
     KnowledgeArtifactForm,
     KnowledgeArtifactResponse,
+    KnowledgeArtifactPage,
+    KnowledgeArtifactListItem,
+    DashboardResponse,
+    SearchHit,
+    TagFacet,
+    SearchResults,
     RatingForm,
     RatingResponse,
     ArtifactReviewStatusForm,
+    ReviewQueueItem,
+    ReviewQueuePage,
+    ImportProgressResponse,
+    ArtifactBatchResult,
+    ArtifactReviewBatchForm,
+    BatchItemResult,
+    RatingBatchForm,
+    RatingBatchResult,
+    JobResponse,
+    ArtifactRevisionDiff,
+    ArtifactRevisionResponse,
+    ArtifactRevisionSummary,
    
 )
 from auth import (
-    get_password_hash, 
+    stream_user,
+    hash_password,
     authenticate_user, 
     create_access_token, 
     create_refresh_token, 
@@ -43,22 +98,92 @@ from settings import settings
 
 router = APIRouter(prefix="/api")
 
+REVIEWER_ROLES = [SystemRole.KNOWLEDGE_CHAMPION, SystemRole.ADMIN]
+OPEN_REVIEW_DECISIONS = [ReviewDecision.PENDING, ReviewDecision.SUBMITTED, ReviewDecision.CHANGES_REQUESTED]
+
+# Columns needed by KnowledgeArtifactListItem; listings never load content.
+LIST_COLUMNS = (
+    KnowledgeArtifact.id,
+    KnowledgeArtifact.title,
+    KnowledgeArtifact.summary,
+    KnowledgeArtifact.status,
+    KnowledgeArtifact.file,
+    KnowledgeArtifact.file_sha256,
+    KnowledgeArtifact.created_by,
+    KnowledgeArtifact.created_on,
+)
+
+# user id -> (generation, DashboardResponse); dropped by every write that
+# changes what the owner's dashboard shows.
+dashboard_cache = TTLCache(settings.DASHBOARD_CACHE_MAX_SIZE, settings.DASHBOARD_CACHE_TTL_SECONDS)
+
+# (generation, tags, tag_mode) -> facet counts; cleared by every artifact write.
+tag_facet_cache = TTLCache(settings.TAG_FACET_CACHE_MAX_SIZE, settings.TAG_FACET_CACHE_TTL_SECONDS)
+
+
+def _artifacts_changed(owner_id: uuid.UUID, artifact_id: uuid.UUID | None = None):
+    dashboard_cache.pop(owner_id)
+    tag_facet_cache.clear()
+    evict_artifact(artifact_id)
+
+
+async def _load_artifact(db, artifact_id: uuid.UUID):
+    # Relationships serialized by KnowledgeArtifactResponse are loaded
+    # up front; an AsyncSession cannot lazy-load them during serialization.
+    return await db.scalar(
+        select(KnowledgeArtifact)
+        .options(selectinload(KnowledgeArtifact.review), selectinload(KnowledgeArtifact.tags))
+        .where(KnowledgeArtifact.id == artifact_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+# Not under /blobs/{sha256}/, where it would shadow an upload named thumbnail.png.
+@router.get("/thumbnails/{sha256}.png")
+async def get_thumbnail(request: Request, sha256: str = Path(..., pattern="^[0-9a-f]{64}$")):
+    return await file_response(request, thumbnail_path(sha256), "thumbnail.png", etag=f'"{sha256}-thumb"', immutable=True)
+
+
+@router.get("/blobs/{sha256}/{filename}")
+async def get_blob(
+    request: Request,
+    filename: str,
+    sha256: str = Path(..., pattern="^[0-9a-f]{64}$"),
+):
+    # The URL names the exact content, so it can be cached forever.
+    return await file_response(request, blob_path(sha256), filename, etag=f'"{sha256}"', immutable=True)
+
 
 @router.get("/files/{user_id}/{file_model_type}/{filename}")
 
-async def get_file(user_id: str, file_model_type: str, filename: str):
+async def get_file(request: Request, user_id: str, file_model_type: str, filename: str, db=Depends(get_db)):
 
+    try:
+        owner_id = uuid.UUID(user_id)
+    except ValueError:
+        return Response(content="File not found", status_code=404)
+
+    sha256 = await db.scalar(
+        select(KnowledgeArtifact.file_sha256)
+        .where(KnowledgeArtifact.created_by == owner_id, KnowledgeArtifact.file == filename)
+        .where(KnowledgeArtifact.file_sha256.is_not(None))
+        .limit(1)
+    )
+    if sha256:
+        return await file_response(request, blob_path(sha256), filename, etag=f'"{sha256}"')
+
+    # Uploads made before the blob store are still served from their old path.
     file_path = os.path.join(settings.MEDIA_DIR, user_id, file_model_type, filename)
-    if os.path.exists(file_path):
-        return FileResponse(path=file_path, filename=filename)
-    
-    return Response(content="File not found", status_code=404)
+    return await file_response(request, file_path, filename)
 
 
 @router.post("/register", response_model=UserResponse)
-async def register(data: UserForm, db=Depends(get_db)):
+async def register(data: UserForm, request: Request, db=Depends(get_db)):
+
+    if retry_after := await ratelimit.check("register", "ip", ratelimit.client_ip(request)):
+        return ratelimit.too_many_requests(retry_after)
 
-    if db.query(User).filter(User.email == data.email).first():
+    if await db.scalar(select(User.id).where(User.email == data.email)):
         return Response(content="Email already registered", status_code=400)
 
     new_user = User(
@@ -67,19 +192,26 @@ async def register(data: UserForm, db=Depends(get_db)):
         role=data.role,
         region=data.region,
         is_trusted_contributor=data.is_trusted_contributor,
-        password=get_password_hash(data.password),
+        password=await hash_password(data.password),
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(data: LoginForm, db=Depends(get_db)):
+async def login(data: LoginForm, request: Request, db=Depends(get_db)):
 
-    user = authenticate_user(db, data.email, data.password)
+    # Per IP against floods, per account against credential stuffing.
+    if retry_after := (
+        await ratelimit.check("login", "ip", ratelimit.client_ip(request))
+        or await ratelimit.check("login", "user", data.email.strip().lower())
+    ):
+        return ratelimit.too_many_requests(retry_after)
+
+    user = await authenticate_user(db, data.email, data.password)
     if not user:
         return Response(content="Invalid credentials", status_code=401)
 
@@ -94,9 +226,14 @@ async def login(data: LoginForm, db=Depends(get_db)):
 
 
 @router.post("/refresh-token", response_model=TokenResponse)
-async def refresh_access_token(refresh_token: dict):
+async def refresh_access_token(refresh_token: dict, request: Request):
+    if retry_after := await ratelimit.check("refresh-token", "ip", ratelimit.client_ip(request)):
+        return ratelimit.too_many_requests(retry_after)
+
     payload = decode_token(refresh_token['refresh_token'])
     user_id = payload.get("sub")
+    if retry_after := await ratelimit.check("refresh-token", "user", str(user_id)):
+        return ratelimit.too_many_requests(retry_after)
 
     access_token = create_access_token(data={"sub": user_id})
     refresh_token = create_refresh_token(data={"sub": user_id})
@@ -109,38 +246,202 @@ async def refresh_access_token(refresh_token: dict):
 
 
 @router.get("/profile", response_model=UserResponse)
-async def get_profile(current_user: User = Depends(auth_user)):
-    return current_user
+async def get_profile(current_user: AuthenticatedUser = Depends(auth_user), db=Depends(get_db)):
+    return await db.get(User, current_user.id)
+
+
+@router.get("/dashboard", response_model=DashboardResponse)
+async def get_dashboard(current_user: AuthenticatedUser = Depends(auth_user), db=Depends(get_db)):
+    generation, = await read_generations(db, user_scope(current_user.id))
+    cached = dashboard_cache.get(current_user.id)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    # One grouped pass over the user's artifacts yields every counter.
+    totals = await db.execute(
+        select(
+            KnowledgeArtifact.status,
+            ArtifactReviewStatus.decision,
+            func.count(KnowledgeArtifact.id),
+            func.coalesce(func.sum(ArtifactRatingSummary.rating_count), 0),
+            func.coalesce(func.sum(ArtifactRatingSummary.rating_sum), 0),
+        )
+        .outerjoin(ArtifactReviewStatus, ArtifactReviewStatus.artifact_id == KnowledgeArtifact.id)
+        .outerjoin(ArtifactRatingSummary, ArtifactRatingSummary.artifact_id == KnowledgeArtifact.id)
+        .where(KnowledgeArtifact.created_by == current_user.id)
+        .group_by(KnowledgeArtifact.status, ArtifactReviewStatus.decision)
+    )
 
+    artifact_counts = {status: 0 for status in ArtifactStatus}
+    review_counts = {decision: 0 for decision in ReviewDecision}
+    rating_count = rating_sum = 0
+    for status, decision, count, ratings, score_total in totals:
+        artifact_counts[status] += count
+        if decision is not None:
+            review_counts[decision] += count
+        rating_count += ratings
+        rating_sum += score_total
+
+    recent_artifacts = await db.scalars(
+        select(KnowledgeArtifact)
+        .options(load_only(*LIST_COLUMNS), selectinload(KnowledgeArtifact.tags))
+        .where(KnowledgeArtifact.created_by == current_user.id)
+        .order_by(KnowledgeArtifact.last_updated.desc())
+        .limit(settings.DASHBOARD_RECENT_ARTIFACTS)
+    )
 
-@router.get("/dashboard")
-async def get_dashboard(current_user: User = Depends(auth_user)):
-    artifacts = current_user.artifacts
-    return {
-        "user": current_user,
-        "artifacts": artifacts,
-    }
+    dashboard = DashboardResponse(
+        user=await db.get(User, current_user.id),
+        artifact_counts=artifact_counts,
+        review_counts=review_counts,
+        rating_count=rating_count,
+        rating_average=rating_sum / rating_count if rating_count else None,
+        recent_artifacts=recent_artifacts.all(),
+    )
+    dashboard_cache.set(current_user.id, (generation, dashboard))
+    return dashboard
 
 
-@router.get("/artifacts", response_model=list[KnowledgeArtifactResponse])
-async def list_artifacts(db=Depends(get_db)):
-    artifacts = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.status == ArtifactStatus.PUBLISHED).all()
-    return artifacts
+def _published_filters(tags: list[str] | None, tag_mode: str) -> list:
+    filters = [KnowledgeArtifact.status == ArtifactStatus.PUBLISHED]
+    tags = normalize_tags(tags or [])
+    if tags:
+        filters.append(tag_filter(tags, tag_mode))
+    return filters
+
+
+@router.get("/artifacts", response_model=KnowledgeArtifactPage)
+async def list_artifacts(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    tag: list[str] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    db=Depends(get_db)
+):
+    generation, = await read_generations(db, ARTIFACTS)
+    cache_key = ("list", generation, cursor, limit, tuple(sorted(normalize_tags(tag or []))), tag_mode)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(request, cached)
+
+    # Listing never needs the content body, so it is left out of the SELECT
+    # and pages are walked with a (created_on, id) keyset instead of OFFSET.
+    if settings.FAST_JSON_RESPONSES:
+        query = list_item_rows()
+    else:
+        query = select(KnowledgeArtifact).options(
+            load_only(*LIST_COLUMNS),
+            selectinload(KnowledgeArtifact.tags),
+        )
+    query = query.where(*_published_filters(tag, tag_mode))
+
+    if cursor:
+        try:
+            query = query.where(keyset_filter(KnowledgeArtifact.created_on, KnowledgeArtifact.id, cursor))
+        except ValueError:
+            return Response(content="Invalid cursor", status_code=400)
+
+    query = query.order_by(KnowledgeArtifact.created_on.desc(), KnowledgeArtifact.id.desc()).limit(limit + 1)
+
+    if settings.FAST_JSON_RESPONSES:
+        rows = (await db.execute(query)).all()
+        items, next_cursor = paginate(rows, limit, lambda row: (row.created_on, row.id))
+        tags = await load_tags(db, [row.id for row in items])
+        body = artifact_page_adapter.dump_json({
+            "items": [list_item_json(row, tags[row.id]) for row in items],
+            "next_cursor": next_cursor,
+        })
+        return json_response(request, cache_body(cache_key, body))
+
+    rows = (await db.scalars(query)).all()
+    items, next_cursor = paginate(rows, limit, lambda artifact: (artifact.created_on, artifact.id))
+    page = KnowledgeArtifactPage(items=items, next_cursor=next_cursor)
+    return json_response(request, cache_json(cache_key, page))
+
+
+@router.get("/artifacts/tag-facets", response_model=list[TagFacet])
+async def list_tag_facets(
+    tag: list[str] | None = Query(None),
+    tag_mode: str = Query("all", pattern="^(all|any)$"),
+    db=Depends(get_db)
+):
+    tags = normalize_tags(tag or [])
+    generation, = await read_generations(db, ARTIFACTS)
+    key = (generation, tuple(sorted(tags)), tag_mode)
+    facets = tag_facet_cache.get(key)
+    if facets is None:
+        rows = await db.execute(facet_query(_published_filters(tags, tag_mode), settings.TAG_FACET_LIMIT))
+        facets = [TagFacet(tag=name, count=count) for name, count in rows]
+        tag_facet_cache.set(key, facets)
+    return facets
+
+
+@router.get("/artifacts/top-rated", response_model=list[KnowledgeArtifactListItem])
+async def list_top_rated_artifacts(
+    sort: str = Query("rating", pattern="^(rating|trending)$"),
+    min_ratings: int = Query(1, ge=1),
+    limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    db=Depends(get_db)
+):
+    # Both orderings read straight off an indexed column of the summary table.
+    order = ArtifactRatingSummary.bayesian_average if sort == "rating" else ArtifactRatingSummary.trending_score
+    query = (
+        select(KnowledgeArtifact)
+        .join(KnowledgeArtifact.rating_summary)
+        .options(contains_eager(KnowledgeArtifact.rating_summary), selectinload(KnowledgeArtifact.tags))
+        .where(
+            KnowledgeArtifact.status == ArtifactStatus.PUBLISHED,
+            ArtifactRatingSummary.rating_count >= min_ratings,
+        )
+        .order_by(order.desc(), KnowledgeArtifact.id)
+        .limit(limit)
+    )
+    return (await db.scalars(query)).all()
+
+
+@router.get("/search", response_model=SearchResults)
+async def search(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db=Depends(get_db)
+):
+    hits = await db.run_sync(search_artifacts, q, limit, offset)
+    items = [
+        SearchHit(
+            id=artifact.id,
+            title=artifact.title,
+            summary=artifact.summary,
+            created_by=artifact.created_by,
+            created_on=artifact.created_on,
+            score=score,
+            snippet=snippet,
+        )
+        for artifact, score, snippet in hits[:limit]
+    ]
+    next_offset = offset + limit if len(hits) > limit else None
+    return SearchResults(items=items, next_offset=next_offset)
 
 
 @router.get("/artifacts/my-artifacts", response_model=list[KnowledgeArtifactResponse])
 async def list_my_artifacts(
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    artifacts = db.query(KnowledgeArtifact).options(joinedload(KnowledgeArtifact.review)).filter(KnowledgeArtifact.created_by == current_user.id).all()
-    return artifacts
+    order = (KnowledgeArtifact.created_on.desc(), KnowledgeArtifact.id.desc())
+    if settings.FAST_JSON_RESPONSES:
+        query = artifact_rows().where(KnowledgeArtifact.created_by == current_user.id).order_by(*order)
+        return Response(content=await dump_artifacts(db, query), media_type="application/json")
+
+    artifacts = await db.scalars(select(KnowledgeArtifact).options(joinedload(KnowledgeArtifact.review), selectinload(KnowledgeArtifact.tags)).where(KnowledgeArtifact.created_by == current_user.id).order_by(*order))
+    return artifacts.all()
 
 
 @router.post("/create-artifact", response_model=KnowledgeArtifactResponse)
 async def create_artifact(
     data: KnowledgeArtifactForm = Depends(KnowledgeArtifactForm.as_form),
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
     try:
@@ -154,89 +455,243 @@ async def create_artifact(
 
         # Handle file upload if present
         if data.file:
-            file_location = f"{settings.MEDIA_DIR}/{current_user.id}/artifacts/{data.file.filename}"
-            os.makedirs(os.path.dirname(file_location), exist_ok=True)
-            with open(file_location, "wb+") as file_object:
-                file_object.write(data.file.file.read())
+            sha256, size = await save_upload(db, data.file)
             new_artifact.file = data.file.filename
+            new_artifact.file_sha256 = sha256
 
         db.add(new_artifact)
-        db.commit()
-        db.refresh(new_artifact)
+        await db.flush()
+        await db.run_sync(set_tags, new_artifact, data.tags or [])
+        await db.run_sync(record_revision, new_artifact, current_user.id)
+        await db.run_sync(index_artifact, new_artifact)
+        # Text extraction, thumbnails and a missing summary are left to
+        # the job worker; the blob is already durable at this point.
+        if new_artifact.file_sha256 or not new_artifact.summary.strip():
+            enqueue_upload_job(db, new_artifact)
+        await bump_generations(db, [ARTIFACTS, user_scope(current_user.id)])
+        await db.commit()
+        _artifacts_changed(current_user.id)
+
+        return await _load_artifact(db, new_artifact.id)
+
+    except HTTPException:
+        raise
 
-        return new_artifact
-    
     except Exception as e:
         return Response(content=str(e), status_code=500)
     
 
+@router.get("/artifacts/batch", response_model=list[ArtifactBatchResult])
+async def get_artifacts_batch(ids: list[uuid.UUID] = Query(..., max_length=settings.BATCH_MAX_ITEMS), db=Depends(get_db)):
+    artifacts = await db.scalars(
+        select(KnowledgeArtifact)
+        .options(selectinload(KnowledgeArtifact.review), selectinload(KnowledgeArtifact.tags))
+        .where(KnowledgeArtifact.id.in_(set(ids)))
+    )
+    found = {artifact.id: artifact for artifact in artifacts}
+
+    return [
+        ArtifactBatchResult(artifact_id=artifact_id, status_code=200, artifact=found[artifact_id])
+        if artifact_id in found
+        else ArtifactBatchResult(artifact_id=artifact_id, status_code=404, error="Artifact not found")
+        for artifact_id in ids
+    ]
+
+
 @router.get("/artifacts/{artifact_id}", response_model=KnowledgeArtifactResponse)
-async def get_artifact(artifact_id: uuid.UUID, db=Depends(get_db)):
-    artifact = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.id == artifact_id).first()
-    review = db.query(ArtifactReviewStatus).filter(ArtifactReviewStatus.artifact_id == artifact_id).first()
-    if review:
-        artifact.review_requested = True
-        artifact.review_status = review.decision
-            
+async def get_artifact(artifact_id: uuid.UUID, request: Request, db=Depends(get_db)):
+    # A primary-key probe for (status, version) decides whether the
+    # serialized body of a published artifact can be reused.
+    probe = (await db.execute(
+        select(KnowledgeArtifact.status, KnowledgeArtifact.version).where(KnowledgeArtifact.id == artifact_id)
+    )).first()
+    if probe is None:
+        return Response(content="Artifact not found", status_code=404)
+
+    if probe.status == ArtifactStatus.PUBLISHED:
+        cached = response_cache.get(("artifact", artifact_id, probe.version))
+        if cached is not None:
+            return json_response(request, cached)
+
+    artifact = await _load_artifact(db, artifact_id)
     if not artifact:
         return Response(content="Artifact not found", status_code=404)
-    return artifact
+    if artifact.status != ArtifactStatus.PUBLISHED:
+        return artifact
+
+    key = ("artifact", artifact.id, artifact.version)
+    return json_response(request, cache_json(key, KnowledgeArtifactResponse.model_validate(artifact)))
     
 
 @router.put("/artifacts/{artifact_id}", response_model=KnowledgeArtifactResponse)
 async def update_artifact(
     artifact_id: uuid.UUID,
     data: KnowledgeArtifactForm = Depends(KnowledgeArtifactForm.as_form),
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    artifact = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.id == artifact_id).first()
+    # Lock the row before reading it, so that previous below is the state
+    # this update replaces (a no-op on SQLite; see record_revision).
+    await db.execute(select(KnowledgeArtifact.id).where(KnowledgeArtifact.id == artifact_id).with_for_update())
+    artifact = await db.get(KnowledgeArtifact, artifact_id)
     if not artifact:
         return Response(content="Artifact not found", status_code=404)
 
     if artifact.created_by != current_user.id:
         return Response(content="Unauthorized", status_code=403)
 
+    previous = (artifact.title, artifact.summary, artifact.content)
     artifact.title = data.title
     artifact.content = data.content
     artifact.summary = data.summary
     artifact.status = data.status
     artifact.last_updated = datetime.now(timezone.utc)
 
-    # Handle file upload if present and also remove old file
+    # Handle file upload if present and release the old file
+    orphaned_sha256 = None
+    legacy_file_path = None
     if data.file:
-        # Remove old file if exists
-        if artifact.file:
-            old_file_path = os.path.join(settings.MEDIA_DIR, str(current_user.id), "artifacts", artifact.file)
-            if os.path.exists(old_file_path):
-                os.remove(old_file_path)
-
-        file_location = f"{settings.MEDIA_DIR}/{current_user.id}/artifacts/{data.file.filename}"
-        os.makedirs(os.path.dirname(file_location), exist_ok=True)
-        with open(file_location, "wb+") as file_object:
-            file_object.write(data.file.file.read())
+        sha256, size = await save_upload(db, data.file)
+
+        if artifact.file_sha256:
+            if await release_reference(db, artifact.file_sha256):
+                orphaned_sha256 = artifact.file_sha256
+        elif artifact.file:
+            legacy_file_path = os.path.join(settings.MEDIA_DIR, str(current_user.id), "artifacts", artifact.file)
+
         artifact.file = data.file.filename
+        artifact.file_sha256 = sha256
+        artifact.extracted_text = None
+
+    if data.tags is not None:
+        await db.run_sync(set_tags, artifact, data.tags)
+
+    await db.run_sync(record_revision, artifact, current_user.id, previous)
+    await db.run_sync(index_artifact, artifact)
+    if data.file or not artifact.summary.strip():
+        enqueue_upload_job(db, artifact)
+    await bump_generations(db, [ARTIFACTS, user_scope(current_user.id)], [artifact.id])
+    await db.commit()
+    _artifacts_changed(current_user.id, artifact.id)
+
+    if orphaned_sha256:
+        await remove_orphan(db, orphaned_sha256)
+    if legacy_file_path and os.path.exists(legacy_file_path):
+        stat_cache.pop(legacy_file_path, None)
+        os.remove(legacy_file_path)
+
+    return await _load_artifact(db, artifact.id)
+
+@router.get("/artifacts/{artifact_id}/jobs", response_model=list[JobResponse])
+async def get_artifact_jobs(
+    artifact_id: uuid.UUID,
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    created_by = await db.scalar(select(KnowledgeArtifact.created_by).where(KnowledgeArtifact.id == artifact_id))
+    if created_by is None:
+        return Response(content="Artifact not found", status_code=404)
+
+    if created_by != current_user.id:
+        return Response(content="Unauthorized", status_code=403)
+
+    jobs = await db.scalars(select(Job).where(Job.artifact_id == artifact_id).order_by(Job.created_on.desc(), Job.id))
+    return jobs.all()
 
-    db.commit()
-    db.refresh(artifact)
 
-    return artifact
+async def _revision_access(db, artifact_id: uuid.UUID, current_user: AuthenticatedUser):
+    # History includes unpublished drafts: owners and reviewers only.
+    created_by = await db.scalar(select(KnowledgeArtifact.created_by).where(KnowledgeArtifact.id == artifact_id))
+    if created_by is None:
+        return Response(content="Artifact not found", status_code=404)
+    if created_by != current_user.id and current_user.role not in REVIEWER_ROLES:
+        return Response(content="Unauthorized", status_code=403)
+    return None
+
+
+@router.get("/artifacts/{artifact_id}/revisions", response_model=list[ArtifactRevisionSummary])
+async def list_artifact_revisions(
+    artifact_id: uuid.UUID,
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    if denied := await _revision_access(db, artifact_id, current_user):
+        return denied
+
+    revisions = await db.execute(
+        select(
+            ArtifactRevision.number,
+            ArtifactRevision.title,
+            ArtifactRevision.content_size,
+            ArtifactRevision.created_by,
+            ArtifactRevision.created_on,
+        )
+        .where(ArtifactRevision.artifact_id == artifact_id)
+        .order_by(ArtifactRevision.number.desc())
+    )
+    return revisions.all()
+
+
+@router.get("/artifacts/{artifact_id}/revisions/{number}", response_model=ArtifactRevisionResponse)
+async def get_artifact_revision(
+    artifact_id: uuid.UUID,
+    number: int,
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    if denied := await _revision_access(db, artifact_id, current_user):
+        return denied
+
+    loaded = await db.run_sync(load_revision, artifact_id, number)
+    if loaded is None:
+        return Response(content="Revision not found", status_code=404)
+
+    revision, content = loaded
+    return ArtifactRevisionResponse(**ArtifactRevisionSummary.model_validate(revision).model_dump(), summary=revision.summary, content=content)
+
+
+@router.get("/artifacts/{artifact_id}/revisions/{number}/diff", response_model=ArtifactRevisionDiff)
+async def diff_artifact_revision(
+    artifact_id: uuid.UUID,
+    number: int,
+    against: int | None = Query(None, description="Revision to compare with; defaults to the one before"),
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    if denied := await _revision_access(db, artifact_id, current_user):
+        return denied
+
+    against = number - 1 if against is None else against
+    old = await db.run_sync(load_revision, artifact_id, against)
+    new = await db.run_sync(load_revision, artifact_id, number)
+    if old is None or new is None:
+        return Response(content="Revision not found", status_code=404)
+
+    return ArtifactRevisionDiff(from_revision=against, to_revision=number, diff=diff_revisions(*old, *new))
+
 
 @router.delete("/artifacts/{artifact_id}")
 async def delete_artifact(
     artifact_id: uuid.UUID,
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    artifact = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.id == artifact_id).first()
+    artifact = await db.get(KnowledgeArtifact, artifact_id)
     if not artifact:
         return Response(content="Artifact not found", status_code=404)
 
     if artifact.created_by != current_user.id:
         return Response(content="Unauthorized", status_code=403)
 
-    db.delete(artifact)
-    db.commit()
+    orphaned = await release_reference(db, artifact.file_sha256)
+    await db.run_sync(remove_artifact, artifact.id)
+    await db.delete(artifact)
+    await bump_generations(db, [ARTIFACTS, user_scope(current_user.id)])
+    await db.commit()
+    _artifacts_changed(current_user.id, artifact.id)
+
+    if orphaned:
+        await remove_orphan(db, artifact.file_sha256)
 
     return Response(content="Artifact deleted successfully", status_code=200)
 
@@ -244,10 +699,10 @@ async def delete_artifact(
 @router.post("/publish-artifact/{artifact_id}")
 async def publish_artifact(
     artifact_id: uuid.UUID,
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    artifact = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.id == artifact_id).first()
+    artifact = await db.get(KnowledgeArtifact, artifact_id)
     if not artifact:
         return Response(content="Artifact not found", status_code=404)
     
@@ -260,8 +715,11 @@ async def publish_artifact(
     artifact.status = 'PUBLISHED'
     artifact.last_updated = datetime.now(timezone.utc)
 
-    db.commit()
-    db.refresh(artifact)
+    await db.run_sync(index_artifact, artifact)
+    await bump_generations(db, [ARTIFACTS, user_scope(current_user.id)], [artifact.id])
+    await db.commit()
+    _artifacts_changed(current_user.id, artifact.id)
+    events.bus.publish(events.ARTIFACT_PUBLISHED, {"artifact_id": artifact.id, "title": artifact.title}, artifact.created_by, public=True)
 
     return Response(content="Artifact published successfully", status_code=200)
 
@@ -269,17 +727,17 @@ async def publish_artifact(
 @router.post("/request-review/{artifact_id}")
 async def request_artifact_review(
     artifact_id: uuid.UUID,
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    artifact = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.id == artifact_id).first()
+    artifact = await db.get(KnowledgeArtifact, artifact_id)
     if not artifact:
         return Response(content="Artifact not found", status_code=404)
     
     if artifact.created_by != current_user.id:
         return Response(content="Unauthorized", status_code=403)
 
-    existing_review = db.query(ArtifactReviewStatus).filter(ArtifactReviewStatus.artifact_id == artifact_id).all()
+    existing_review = await db.scalar(select(ArtifactReviewStatus.id).where(ArtifactReviewStatus.artifact_id == artifact_id))
     if existing_review:
         return Response(content="Review already requested for this artifact", status_code=400)
 
@@ -288,75 +746,329 @@ async def request_artifact_review(
     )
 
     db.add(new_review_request)
-    db.commit()
-    db.refresh(new_review_request)
+    await bump_generations(db, [user_scope(current_user.id)], [artifact_id])
+    await db.commit()
+    dashboard_cache.pop(current_user.id)
+    evict_artifact(artifact_id)
+    events.bus.publish(events.REVIEW_REQUESTED, {"artifact_id": artifact_id, "title": artifact.title}, artifact.created_by, reviewers=True)
 
     return Response(content="Review requested successfully", status_code=200)
 
 
 @router.get("/review-requests", response_model=list[KnowledgeArtifactResponse])
 async def list_review_requests(
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    if current_user.role not in REVIEWER_ROLES:
+        return Response(content="Permission denied. Only Knowledge Champions and Admins can view review requests.", status_code=403)
+
+    order = (ArtifactReviewStatus.submitted_on, ArtifactReviewStatus.id)
+    if settings.FAST_JSON_RESPONSES:
+        query = artifact_rows(review_required=True).where(ArtifactReviewStatus.decision != ReviewDecision.APPROVED).order_by(*order)
+        return Response(content=await dump_artifacts(db, query), media_type="application/json")
+
+    review_requests = await db.scalars(select(KnowledgeArtifact).join(ArtifactReviewStatus).options(joinedload(KnowledgeArtifact.review), selectinload(KnowledgeArtifact.tags)).where(ArtifactReviewStatus.decision != ReviewDecision.APPROVED).order_by(*order))
+    return review_requests.all()
+
+
+def _review_queue_filter(query, decisions: list[ReviewDecision], region: Region | None):
+    query = query.where(ArtifactReviewStatus.decision.in_(decisions))
+    if region is not None:
+        query = query.where(User.region == region)
+    return query
+
+
+@router.get("/review-queue", response_model=ReviewQueuePage)
+async def list_review_queue(
+    decision: list[ReviewDecision] | None = Query(None),
+    region: Region | None = None,
+    cursor: str | None = None,
+    limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    if current_user.role not in REVIEWER_ROLES:
+        return Response(content="Permission denied. Only Knowledge Champions and Admins can view review requests.", status_code=403)
+
+    # Oldest request first, walked on the (decision, submitted_on, id) index.
+    query = _review_queue_filter(
+        select(
+            ArtifactReviewStatus.id.label("review_id"),
+            KnowledgeArtifact.id.label("artifact_id"),
+            KnowledgeArtifact.title,
+            KnowledgeArtifact.summary,
+            KnowledgeArtifact.status,
+            KnowledgeArtifact.created_by.label("author_id"),
+            User.region.label("author_region"),
+            ArtifactReviewStatus.decision,
+            ArtifactReviewStatus.submitted_on,
+        )
+        .join(KnowledgeArtifact, KnowledgeArtifact.id == ArtifactReviewStatus.artifact_id)
+        .join(User, User.id == KnowledgeArtifact.created_by),
+        decision or OPEN_REVIEW_DECISIONS,
+        region,
+    )
+
+    if cursor:
+        try:
+            query = query.where(keyset_filter(ArtifactReviewStatus.submitted_on, ArtifactReviewStatus.id, cursor, descending=False))
+        except ValueError:
+            return Response(content="Invalid cursor", status_code=400)
+
+    query = query.order_by(ArtifactReviewStatus.submitted_on, ArtifactReviewStatus.id).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    items, next_cursor = paginate(rows, limit, lambda row: (row.submitted_on, row.review_id))
+    return ReviewQueuePage(
+        items=[ReviewQueueItem.model_validate(row._mapping) for row in items],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/review-queue/counts", response_model=dict[ReviewDecision, int])
+async def count_review_queue(
+    region: Region | None = None,
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    if current_user.role not in [SystemRole.KNOWLEDGE_CHAMPION, SystemRole.ADMIN]:
+    if current_user.role not in REVIEWER_ROLES:
         return Response(content="Permission denied. Only Knowledge Champions and Admins can view review requests.", status_code=403)
 
-    review_requests = db.query(KnowledgeArtifact).join(ArtifactReviewStatus).options(joinedload(KnowledgeArtifact.review)).filter(ArtifactReviewStatus.decision != ReviewDecision.APPROVED).all()
-    return review_requests
+    query = select(ArtifactReviewStatus.decision, func.count()).group_by(ArtifactReviewStatus.decision)
+    if region is not None:
+        query = (
+            query.join(KnowledgeArtifact, KnowledgeArtifact.id == ArtifactReviewStatus.artifact_id)
+            .join(User, User.id == KnowledgeArtifact.created_by)
+            .where(User.region == region)
+        )
+
+    counts = {decision: 0 for decision in ReviewDecision}
+    counts.update((await db.execute(query)).all())
+    return counts
+
+
+def _publish_review_decided(review: ArtifactReviewStatus, owner_id: uuid.UUID):
+    events.bus.publish(events.REVIEW_DECIDED, {
+        "artifact_id": review.artifact_id,
+        "decision": review.decision,
+        "comments": review.comments,
+        "reviewed_by": review.reviewed_by,
+    }, owner_id, reviewers=True)
 
 
 @router.post("/review-artifact/{artifact_id}")
 async def review_artifact(
     artifact_id: uuid.UUID,
     data: ArtifactReviewStatusForm,
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    artifact = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.id == artifact_id).first()
+    artifact = await db.get(KnowledgeArtifact, artifact_id)
     if not artifact:
         return Response(content="Artifact not found", status_code=404)
     
-    review = db.query(ArtifactReviewStatus).filter(ArtifactReviewStatus.artifact_id == artifact_id).first()
+    review = await db.scalar(select(ArtifactReviewStatus).where(ArtifactReviewStatus.artifact_id == artifact_id))
     if not review:
         return Response(content="No review request found for this artifact", status_code=404)
     
-    if not current_user.role in [SystemRole.KNOWLEDGE_CHAMPION, SystemRole.ADMIN]:
+    if current_user.role not in REVIEWER_ROLES:
         return Response(content="Permission denied. Only Knowledge Champions and Admins can review artifacts.", status_code=403)
 
     review.decision = data.decision
-    print(f"Review decision: {data.decision}, comments: {data.comments}")
     review.comments = data.comments
     review.reviewed_by = current_user.id
 
-    db.commit()
-    db.refresh(review)
+    await bump_generations(db, [user_scope(artifact.created_by)], [artifact.id])
+    await db.commit()
+    dashboard_cache.pop(artifact.created_by)
+    evict_artifact(artifact.id)
+    _publish_review_decided(review, artifact.created_by)
 
     return Response(content="Artifact reviewed successfully", status_code=200)
 
 
+@router.post("/review-artifacts", response_model=list[BatchItemResult])
+async def review_artifacts(
+    data: ArtifactReviewBatchForm,
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    if current_user.role not in REVIEWER_ROLES:
+        return Response(content="Permission denied. Only Knowledge Champions and Admins can review artifacts.", status_code=403)
+
+    rows = (await db.execute(
+        select(KnowledgeArtifact.id, KnowledgeArtifact.created_by, ArtifactReviewStatus)
+        .outerjoin(ArtifactReviewStatus, ArtifactReviewStatus.artifact_id == KnowledgeArtifact.id)
+        .where(KnowledgeArtifact.id.in_({item.artifact_id for item in data.items}))
+    )).all()
+    found = {row.id: row for row in rows}
+
+    results = []
+    for item in data.items:
+        row = found.get(item.artifact_id)
+        if row is None:
+            results.append(BatchItemResult(artifact_id=item.artifact_id, status_code=404, error="Artifact not found"))
+        elif row.ArtifactReviewStatus is None:
+            results.append(BatchItemResult(artifact_id=item.artifact_id, status_code=404, error="No review request found for this artifact"))
+        else:
+            review = row.ArtifactReviewStatus
+            review.decision = item.decision
+            review.comments = item.comments
+            review.reviewed_by = current_user.id
+            results.append(BatchItemResult(artifact_id=item.artifact_id, status_code=200))
+
+    reviewed = [result.artifact_id for result in results if result.status_code == 200]
+    await bump_generations(db, [user_scope(found[artifact_id].created_by) for artifact_id in reviewed], reviewed)
+    await db.commit()
+    for result in results:
+        if result.status_code == 200:
+            row = found[result.artifact_id]
+            dashboard_cache.pop(row.created_by)
+            evict_artifact(result.artifact_id)
+            _publish_review_decided(row.ArtifactReviewStatus, row.created_by)
+
+    return results
+
+
+def _publish_rated(rating: Rating, owner_id: uuid.UUID):
+    events.bus.publish(events.ARTIFACT_RATED, {"artifact_id": rating.artifact_id, "score": rating.score}, owner_id)
+
+
 @router.post("/rate-artifact/{artifact_id}", response_model=RatingResponse)
 async def rate_artifact(
     artifact_id: uuid.UUID,
     data: RatingForm,
-    current_user: User = Depends(auth_user),
+    current_user: AuthenticatedUser = Depends(auth_user),
     db=Depends(get_db)
 ):
-    artifact = db.query(KnowledgeArtifact).filter(KnowledgeArtifact.id == artifact_id).first()
+    artifact = await db.get(KnowledgeArtifact, artifact_id)
     if not artifact:
         return Response(content="Artifact not found", status_code=404)
 
     new_rating = Rating(
         artifact_id=artifact_id,
         user_id=current_user.id,
-        score=data.rating_value,
-        comment=data.comment,
+        score=data.score,
+        rated_on=datetime.now(timezone.utc),
     )
 
     db.add(new_rating)
-    db.commit()
-    db.refresh(new_rating)
+    await record_rating(db, new_rating)
+    await bump_generations(db, [ARTIFACTS, user_scope(artifact.created_by)], [artifact.id])
+    await db.commit()
+    dashboard_cache.pop(artifact.created_by)
+    # The rating summary is part of the cached bodies.
+    evict_artifact(artifact.id)
+    _publish_rated(new_rating, artifact.created_by)
+    await db.refresh(new_rating)
 
     return new_rating
 
 
+@router.post("/rate-artifacts", response_model=list[RatingBatchResult])
+async def rate_artifacts(
+    data: RatingBatchForm,
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    owners = dict((await db.execute(
+        select(KnowledgeArtifact.id, KnowledgeArtifact.created_by)
+        .where(KnowledgeArtifact.id.in_({item.artifact_id for item in data.items}))
+    )).all())
+
+    results = []
+    new_ratings = []
+    rated_on = datetime.now(timezone.utc)
+    for item in data.items:
+        if item.artifact_id not in owners:
+            results.append(RatingBatchResult(artifact_id=item.artifact_id, status_code=404, error="Artifact not found"))
+            continue
+        new_rating = Rating(id=uuid.uuid4(), artifact_id=item.artifact_id, user_id=current_user.id, score=item.score, rated_on=rated_on)
+        new_ratings.append(new_rating)
+        results.append(RatingBatchResult(artifact_id=item.artifact_id, status_code=200, rating=new_rating))
+
+    if new_ratings:
+        db.add_all(new_ratings)
+        await record_ratings(db, new_ratings)
+        rated = {rating.artifact_id for rating in new_ratings}
+        await bump_generations(db, [ARTIFACTS, *(user_scope(owners[artifact_id]) for artifact_id in rated)], rated)
+        await db.commit()
+        for artifact_id in rated:
+            dashboard_cache.pop(owners[artifact_id])
+            evict_artifact(artifact_id)
+        for rating in new_ratings:
+            _publish_rated(rating, owners[rating.artifact_id])
+
+    return results
+
+
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    last_event_id: str | None = Query(None),
+    current_user: AuthenticatedUser = Depends(stream_user),
+):
+    # EventSource sends Last-Event-ID itself when it reconnects.
+    last_event_id = request.headers.get("last-event-id", last_event_id)
+    return StreamingResponse(
+        events.sse_stream(current_user.id, current_user.role in REVIEWER_ROLES, last_event_id),
+        media_type="text/event-stream",
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+
+@router.websocket("/events/ws")
+async def stream_events_ws(
+    websocket: WebSocket,
+    last_event_id: str | None = Query(None),
+    current_user: AuthenticatedUser = Depends(stream_user),
+):
+    await events.websocket_stream(websocket, current_user.id, current_user.role in REVIEWER_ROLES, last_event_id)
+
+
+@router.get("/export/artifacts")
+async def export_artifacts(current_user: AuthenticatedUser = Depends(auth_user)):
+    if current_user.role != SystemRole.ADMIN:
+        return Response(content="Permission denied. Only Admins can export artifacts.", status_code=403)
+
+    # The sync generator is iterated in the threadpool, one row batch at a time.
+    return StreamingResponse(export_lines(), media_type="application/x-ndjson")
+
+
+@router.post("/import/artifacts", response_model=ImportProgressResponse)
+async def import_artifacts(
+    request: Request,
+    import_id: str = Query(..., min_length=1, max_length=128),
+    current_user: AuthenticatedUser = Depends(auth_user),
+):
+    if current_user.role != SystemRole.ADMIN:
+        return Response(content="Permission denied. Only Admins can import artifacts.", status_code=403)
+
+    # Spool the body so the import can run off the event loop line by line.
+    with tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_CHUNK_SIZE * 8) as body:
+        async for chunk in request.stream():
+            await run_in_threadpool(body.write, chunk)
+        body.seek(0)
+        result = await run_in_threadpool(import_file, body, import_id)
+
+    dashboard_cache.clear()
+    tag_facet_cache.clear()
+    response_cache.clear()
+    return result
+
+
+@router.get("/import/artifacts/{import_id}", response_model=ImportProgressResponse)
+async def get_import_progress(
+    import_id: str,
+    current_user: AuthenticatedUser = Depends(auth_user),
+    db=Depends(get_db)
+):
+    if current_user.role != SystemRole.ADMIN:
+        return Response(content="Permission denied. Only Admins can import artifacts.", status_code=403)
+
+    progress = await db.get(ImportProgress, import_id)
+    if not progress:
+        return Response(content="Import not found", status_code=404)
+    return progress
@@ -2,10 +2,12 @@ from datetime import datetime
 from typing import Optional, List
 from uuid import UUID
 
-from pydantic import BaseModel, computed_field
+from pydantic import BaseModel, Field, computed_field, field_validator
 from fastapi import File, UploadFile, Form
 
-from models import ArtifactStatus, Region, SystemRole, ReviewDecision
+from models import ArtifactStatus, JobState, Region, SystemRole, ReviewDecision
+from settings import settings
+from tags import parse_tags
 
 
 class LoginForm(BaseModel):
@@ -41,21 +43,35 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class AuthenticatedUser(BaseModel):
+    id: UUID
+    role: SystemRole
+    region: Region
+    is_trusted_contributor: Optional[bool] = False
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
+
 class KnowledgeArtifactForm(BaseModel):
     title: str
     summary: str
     content: str
     status: ArtifactStatus | None = ArtifactStatus.DRAFT
     file: UploadFile | None = None
+    # None leaves the artifact's tags unchanged; [] removes them all.
+    tags: List[str] | None = None
 
     @classmethod
     def as_form(
         cls,
         title: str = Form(...),
-        summary: str = Form(...),
+        summary: str = Form("", description="Generated from the content or file when left empty"),
         content: str = Form(...),
         status: ArtifactStatus = Form(ArtifactStatus.DRAFT),
         file: UploadFile = File(None),
+        tags: str | None = Form(None, description="Comma-separated tags"),
     ):
         return cls(
             title=title,
@@ -63,9 +79,30 @@ class KnowledgeArtifactForm(BaseModel):
             content=content,
             status=status,
             file=file,
+            tags=parse_tags(tags),
         )
 
 
+class RatingSummaryResponse(BaseModel):
+    rating_count: int
+    rating_sum: int
+    average: Optional[float] = None
+    bayesian_average: float
+    histogram: dict[int, int]
+
+    class Config:
+        from_attributes = True
+
+
+def artifact_file_url(created_by: UUID, file: Optional[str], file_sha256: Optional[str] = None) -> Optional[str]:
+    if file and file_sha256:
+        # Content-addressed URLs are served with immutable caching.
+        return f"{settings.PUBLIC_BASE_URL}/api/blobs/{file_sha256}/{file}"
+    if file:
+        return f"{settings.PUBLIC_BASE_URL}/api/files/{created_by}/artifacts/{file}"
+    return None
+
+
 class KnowledgeArtifactResponse(BaseModel):
     id: UUID
     title: str
@@ -73,9 +110,17 @@ class KnowledgeArtifactResponse(BaseModel):
     content: str
     status: ArtifactStatus
     file: Optional[str]
+    file_sha256: Optional[str] = Field(default=None, exclude=True)
     created_by: UUID
     created_on: datetime
     review: Optional[ArtifactReviewStatusResponse] = None
+    rating_summary: Optional[RatingSummaryResponse] = None
+    tags: List[str] = []
+
+    @field_validator("tags", mode="before")
+    @classmethod
+    def tag_names(cls, value):
+        return [getattr(tag, "tag", tag) for tag in value]
 
     @computed_field
     @property
@@ -85,14 +130,72 @@ class KnowledgeArtifactResponse(BaseModel):
     @computed_field
     @property
     def file_url(self) -> Optional[str]:
-        if self.file:
-            return f"http://localhost:8000/api/files/{self.created_by}/artifacts/{self.file}"
-        return None
+        return artifact_file_url(self.created_by, self.file, self.file_sha256)
+
+    class Config:
+        from_attributes = True
+
+
+class KnowledgeArtifactListItem(BaseModel):
+    id: UUID
+    title: str
+    summary: str
+    status: ArtifactStatus
+    file: Optional[str]
+    file_sha256: Optional[str] = Field(default=None, exclude=True)
+    created_by: UUID
+    created_on: datetime
+    rating_summary: Optional[RatingSummaryResponse] = None
+    tags: List[str] = []
+
+    @field_validator("tags", mode="before")
+    @classmethod
+    def tag_names(cls, value):
+        return [getattr(tag, "tag", tag) for tag in value]
+
+    @computed_field
+    @property
+    def file_url(self) -> Optional[str]:
+        return artifact_file_url(self.created_by, self.file, self.file_sha256)
 
     class Config:
         from_attributes = True
 
 
+class KnowledgeArtifactPage(BaseModel):
+    items: List[KnowledgeArtifactListItem]
+    next_cursor: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    id: UUID
+    title: str
+    summary: str
+    created_by: UUID
+    created_on: datetime
+    score: float
+    snippet: str
+
+
+class SearchResults(BaseModel):
+    items: List[SearchHit]
+    next_offset: Optional[int] = None
+
+
+class DashboardResponse(BaseModel):
+    user: UserResponse
+    artifact_counts: dict[ArtifactStatus, int]
+    review_counts: dict[ReviewDecision, int]
+    rating_count: int
+    rating_average: Optional[float] = None
+    recent_artifacts: List[KnowledgeArtifactListItem]
+
+
+class TagFacet(BaseModel):
+    tag: str
+    count: int
+
+
 class ArtifactTagForm(BaseModel):
     tag: str
 
@@ -107,7 +210,7 @@ class ArtifactTagResponse(ArtifactTagForm):
 
 class RatingForm(BaseModel):
     artifact_id: UUID
-    score: int
+    score: int = Field(ge=1, le=5)
 
 
 class RatingResponse(BaseModel):
@@ -126,6 +229,50 @@ class ArtifactReviewStatusForm(BaseModel):
     comments: Optional[str] = None
 
 
+class RatingBatchForm(BaseModel):
+    items: List[RatingForm] = Field(min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+
+class ArtifactReviewBatchItem(ArtifactReviewStatusForm):
+    artifact_id: UUID
+
+
+class ArtifactReviewBatchForm(BaseModel):
+    items: List[ArtifactReviewBatchItem] = Field(min_length=1, max_length=settings.BATCH_MAX_ITEMS)
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of one batch item; status_code is what the single-item route would return."""
+    artifact_id: UUID
+    status_code: int
+    error: Optional[str] = None
+
+
+class RatingBatchResult(BatchItemResult):
+    rating: Optional[RatingResponse] = None
+
+
+class ArtifactBatchResult(BatchItemResult):
+    artifact: Optional[KnowledgeArtifactResponse] = None
+
+
+class ReviewQueueItem(BaseModel):
+    review_id: UUID
+    artifact_id: UUID
+    title: str
+    summary: Optional[str] = None
+    status: ArtifactStatus
+    author_id: UUID
+    author_region: Region
+    decision: ReviewDecision
+    submitted_on: datetime
+
+
+class ReviewQueuePage(BaseModel):
+    items: List[ReviewQueueItem]
+    next_cursor: Optional[str] = None
+
+
 class ArtifactReviewStatusResponse(BaseModel):
     id: UUID
     artifact_id: UUID
@@ -137,3 +284,85 @@ class ArtifactReviewStatusResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class RatingRecord(RatingResponse):
+    score: int = Field(ge=1, le=5)
+
+
+class ArtifactRecord(BaseModel):
+    """One line of an NDJSON artifact export/import."""
+
+    id: UUID
+    title: str
+    summary: str = ""
+    content: str
+    status: ArtifactStatus
+    created_by: UUID
+    created_on: datetime
+    last_updated: Optional[datetime] = None
+    tags: List[str] = []
+    review: Optional[ArtifactReviewStatusResponse] = None
+    ratings: List[RatingRecord] = []
+
+    # Responses require a summary; older exports may carry null.
+    @field_validator("summary", mode="before")
+    @classmethod
+    def summary_text(cls, value):
+        return "" if value is None else value
+
+
+class JobResponse(BaseModel):
+    id: UUID
+    kind: str
+    state: JobState
+    step: Optional[str] = None
+    progress: float
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    created_on: datetime
+    updated_on: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ArtifactRevisionSummary(BaseModel):
+    number: int
+    title: str
+    content_size: int
+    created_by: Optional[UUID] = None
+    created_on: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ArtifactRevisionResponse(ArtifactRevisionSummary):
+    summary: Optional[str] = None
+    content: str
+
+
+class ArtifactRevisionDiff(BaseModel):
+    from_revision: int
+    to_revision: int
+    diff: str
+
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportProgressResponse(BaseModel):
+    import_id: str
+    lines_done: int
+    imported: int
+    skipped: int
+    failed: int
+    finished: bool
+    errors: List[ImportLineError] = []
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,282 @@
+import html
+import math
+import re
+from collections import defaultdict
+from uuid import UUID
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import selectinload, undefer
+
+from models import ArtifactStatus, KnowledgeArtifact, SearchDocument, SearchPosting
+from settings import settings
+
+# Relative weight of each indexed field, shared by both backends.
+FIELD_WEIGHTS = {
+    "title": 10.0,
+    "summary": 4.0,
+    "content": 1.0,
+    "tags": 6.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SNIPPET_WORDS = 16
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+# FTS5 marks matches with these; they become the tags above once the text
+# is HTML-escaped, and are stripped from indexed text so only FTS5 adds them.
+FTS5_OPEN = "\x02"
+FTS5_CLOSE = "\x03"
+FTS5_MARKERS = str.maketrans("", "", FTS5_OPEN + FTS5_CLOSE)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+FTS5_TABLE = "artifact_search"
+
+_backend = None
+
+
+def tokenize(value: str | None) -> list[str]:
+    if not value:
+        return []
+    return [token[:64] for token in TOKEN_PATTERN.findall(value.lower())]
+
+
+def _fts5_available(connection) -> bool:
+    options = connection.execute(text("PRAGMA compile_options")).scalars().all()
+    return "ENABLE_FTS5" in options
+
+
+def detect_backend(connection) -> str:
+    backend = settings.SEARCH_BACKEND
+    if backend == "auto":
+        backend = "python"
+        if connection.dialect.name == "sqlite" and _fts5_available(connection):
+            backend = "fts5"
+    return backend
+
+
+def init_search(engine):
+    """Pick the backend; the FTS5 table itself is created by the migrations."""
+    global _backend
+
+    with engine.connect() as connection:
+        _backend = detect_backend(connection)
+
+
+def _get_backend(session) -> str:
+    global _backend
+
+    if _backend is None:
+        _backend = detect_backend(session.connection())
+    return _backend
+
+
+def _document_fields(artifact) -> dict[str, str]:
+    return {
+        "title": artifact.title or "",
+        "summary": artifact.summary or "",
+        "content": " ".join(filter(None, (artifact.content, artifact.extracted_text))),
+        "tags": " ".join(tag.tag for tag in artifact.tags),
+    }
+
+
+def index_artifact(session, artifact):
+    """Bring the index entry of one artifact up to date.
+
+    Runs inside the caller's transaction so the index commits or rolls back
+    together with the artifact itself. Only published artifacts are indexed.
+    """
+    remove_artifact(session, artifact.id)
+    if artifact.status == ArtifactStatus.PUBLISHED:
+        _add_document(session, artifact)
+
+
+def _add_document(session, artifact):
+    fields = _document_fields(artifact)
+
+    if _get_backend(session) == "fts5":
+        session.execute(
+            text(
+                f"INSERT INTO {FTS5_TABLE} (artifact_id, title, summary, content, tags) "
+                "VALUES (:artifact_id, :title, :summary, :content, :tags)"
+            ),
+            {"artifact_id": artifact.id.hex, **{field: value.translate(FTS5_MARKERS) for field, value in fields.items()}},
+        )
+        return
+
+    weights = defaultdict(float)
+    length = 0.0
+    for field, value in fields.items():
+        tokens = tokenize(value)
+        length += FIELD_WEIGHTS[field] * len(tokens)
+        for token in tokens:
+            weights[token] += FIELD_WEIGHTS[field]
+
+    session.add(SearchDocument(artifact_id=artifact.id, length=length))
+    session.add_all(
+        SearchPosting(term=term, artifact_id=artifact.id, weight=weight)
+        for term, weight in weights.items()
+    )
+
+
+def remove_artifact(session, artifact_id):
+    if _get_backend(session) == "fts5":
+        session.execute(
+            text(f"DELETE FROM {FTS5_TABLE} WHERE artifact_id = :artifact_id"),
+            {"artifact_id": artifact_id.hex},
+        )
+        return
+
+    session.query(SearchPosting).filter(SearchPosting.artifact_id == artifact_id).delete(synchronize_session=False)
+    session.query(SearchDocument).filter(SearchDocument.artifact_id == artifact_id).delete(synchronize_session=False)
+
+
+def search_artifacts(session, query: str, limit: int, offset: int = 0):
+    """Return up to limit + 1 ranked hits as (artifact, score, snippet) tuples."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    if _get_backend(session) == "fts5":
+        ranked = _search_fts5(session, terms, limit + 1, offset)
+    else:
+        ranked = _search_python(session, terms, limit + 1, offset)
+
+    if not ranked:
+        return []
+
+    artifact_ids = [artifact_id for artifact_id, _, _ in ranked]
+    artifacts = {
+        artifact.id: artifact
+        for artifact in session.query(KnowledgeArtifact).filter(KnowledgeArtifact.id.in_(artifact_ids))
+    }
+
+    hits = []
+    for artifact_id, score, snippet in ranked:
+        artifact = artifacts.get(artifact_id)
+        if artifact is None:
+            continue
+        if snippet is None:
+            snippet = make_snippet(artifact.content or artifact.summary or "", terms)
+        hits.append((artifact, score, snippet))
+    return hits
+
+
+def _search_fts5(session, terms: list[str], limit: int, offset: int):
+    # Quote every term so user input can never be parsed as FTS5 syntax.
+    match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    weights = ", ".join(str(FIELD_WEIGHTS[field]) for field in ("title", "summary", "content", "tags"))
+    rows = session.execute(
+        text(
+            f"SELECT artifact_id, bm25({FTS5_TABLE}, 0.0, {weights}) AS rank, "
+            f"snippet({FTS5_TABLE}, -1, :open, :close, '…', :words) "
+            f"FROM {FTS5_TABLE} WHERE {FTS5_TABLE} MATCH :match "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        ),
+        {
+            "match": match,
+            "open": FTS5_OPEN,
+            "close": FTS5_CLOSE,
+            "words": SNIPPET_WORDS,
+            "limit": limit,
+            "offset": offset,
+        },
+    ).all()
+
+    # bm25() is "lower is better"; flip it so scores read naturally.
+    return [(UUID(hex=artifact_id), -rank, _mark_fts5_snippet(snippet)) for artifact_id, rank, snippet in rows]
+
+
+def _mark_fts5_snippet(snippet: str) -> str:
+    return html.escape(snippet).replace(FTS5_OPEN, SNIPPET_OPEN).replace(FTS5_CLOSE, SNIPPET_CLOSE)
+
+
+def _search_python(session, terms: list[str], limit: int, offset: int):
+    postings = defaultdict(dict)
+    rows = session.execute(
+        select(SearchPosting.term, SearchPosting.artifact_id, SearchPosting.weight)
+        .where(SearchPosting.term.in_(terms))
+    )
+    for term, artifact_id, weight in rows:
+        postings[term][artifact_id] = weight
+
+    if len(postings) < len(terms):
+        return []
+
+    # Every term must match, like the implicit AND of an FTS5 query.
+    candidates = set.intersection(*(set(docs) for docs in postings.values()))
+    if not candidates:
+        return []
+
+    total_documents, total_length = session.execute(
+        select(func.count(SearchDocument.artifact_id), func.sum(SearchDocument.length))
+    ).one()
+    average_length = (total_length or 0.0) / total_documents if total_documents else 1.0
+
+    lengths = dict(session.execute(
+        select(SearchDocument.artifact_id, SearchDocument.length)
+        .where(SearchDocument.artifact_id.in_(candidates))
+    ).all())
+
+    scores = {}
+    for artifact_id in candidates:
+        length_norm = 1 - BM25_B + BM25_B * lengths.get(artifact_id, 0.0) / (average_length or 1.0)
+        score = 0.0
+        for term, docs in postings.items():
+            idf = math.log(1 + (total_documents - len(docs) + 0.5) / (len(docs) + 0.5))
+            weight = docs[artifact_id]
+            score += idf * weight * (BM25_K1 + 1) / (weight + BM25_K1 * length_norm)
+        scores[artifact_id] = score
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+    return [(artifact_id, score, None) for artifact_id, score in ranked[offset:offset + limit]]
+
+
+def make_snippet(value: str, terms: list[str]) -> str:
+    words = value.split()
+    wanted = set(terms)
+    first_match = next(
+        (index for index, word in enumerate(words) if set(tokenize(word)) & wanted),
+        0,
+    )
+    start = max(0, first_match - SNIPPET_WORDS // 4)
+    window = words[start:start + SNIPPET_WORDS]
+
+    marked = [
+        f"{SNIPPET_OPEN}{html.escape(word)}{SNIPPET_CLOSE}" if set(tokenize(word)) & wanted else html.escape(word)
+        for word in window
+    ]
+    snippet = " ".join(marked)
+    if start > 0:
+        snippet = "…" + snippet
+    if start + SNIPPET_WORDS < len(words):
+        snippet += "…"
+    return snippet
+
+
+def rebuild_index(session):
+    """Re-index every published artifact, e.g. to backfill an existing database."""
+    if _get_backend(session) == "fts5":
+        session.execute(text(f"DELETE FROM {FTS5_TABLE}"))
+    else:
+        session.query(SearchPosting).delete(synchronize_session=False)
+        session.query(SearchDocument).delete(synchronize_session=False)
+
+    published = (
+        session.query(KnowledgeArtifact)
+        .options(selectinload(KnowledgeArtifact.tags), undefer(KnowledgeArtifact.extracted_text))
+        .filter(KnowledgeArtifact.status == ArtifactStatus.PUBLISHED)
+    )
+    for artifact in published.yield_per(500):
+        _add_document(session, artifact)
+    session.commit()
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    with SessionLocal() as db_session:
+        rebuild_index(db_session)
+    print(f"Search index rebuilt using the {_backend} backend")
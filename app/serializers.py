@@ -0,0 +1,204 @@
+"""Row-tuple JSON serialization for the artifact list endpoints.
+
+The TypedDicts mirror KnowledgeArtifactResponse and KnowledgeArtifactListItem
+field for field, computed fields included, so dumping them through a
+TypeAdapter produces the same bytes as the response models without building
+ORM objects or model instances first.
+"""
+from datetime import datetime
+from typing import Optional, TypedDict
+from uuid import UUID
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+from models import (
+    ArtifactRatingSummary,
+    ArtifactReviewStatus,
+    ArtifactStatus,
+    ArtifactTag,
+    KnowledgeArtifact,
+    ReviewDecision,
+)
+from schemas import artifact_file_url
+
+
+class ReviewJSON(TypedDict):
+    id: UUID
+    artifact_id: UUID
+    decision: ReviewDecision
+    comments: Optional[str]
+    reviewed_by: Optional[UUID]
+    submitted_on: datetime
+
+
+class RatingSummaryJSON(TypedDict):
+    rating_count: int
+    rating_sum: int
+    average: Optional[float]
+    bayesian_average: float
+    histogram: dict[int, int]
+
+
+class ArtifactListItemJSON(TypedDict):
+    id: UUID
+    title: str
+    summary: str
+    status: ArtifactStatus
+    file: Optional[str]
+    created_by: UUID
+    created_on: datetime
+    rating_summary: Optional[RatingSummaryJSON]
+    tags: list[str]
+    file_url: Optional[str]
+
+
+class ArtifactJSON(TypedDict):
+    id: UUID
+    title: str
+    summary: str
+    content: str
+    status: ArtifactStatus
+    file: Optional[str]
+    created_by: UUID
+    created_on: datetime
+    review: Optional[ReviewJSON]
+    rating_summary: Optional[RatingSummaryJSON]
+    tags: list[str]
+    review_requested: bool
+    file_url: Optional[str]
+
+
+class ArtifactPageJSON(TypedDict):
+    items: list[ArtifactListItemJSON]
+    next_cursor: Optional[str]
+
+
+artifact_list_adapter = TypeAdapter(list[ArtifactJSON])
+artifact_page_adapter = TypeAdapter(ArtifactPageJSON)
+
+LIST_ITEM_COLUMNS = (
+    KnowledgeArtifact.id,
+    KnowledgeArtifact.title,
+    KnowledgeArtifact.summary,
+    KnowledgeArtifact.status,
+    KnowledgeArtifact.file,
+    KnowledgeArtifact.file_sha256,
+    KnowledgeArtifact.created_by,
+    KnowledgeArtifact.created_on,
+)
+
+SUMMARY_COLUMNS = (
+    ArtifactRatingSummary.rating_count,
+    ArtifactRatingSummary.rating_sum,
+    ArtifactRatingSummary.bayesian_average,
+    ArtifactRatingSummary.score_1,
+    ArtifactRatingSummary.score_2,
+    ArtifactRatingSummary.score_3,
+    ArtifactRatingSummary.score_4,
+    ArtifactRatingSummary.score_5,
+)
+
+REVIEW_COLUMNS = (
+    ArtifactReviewStatus.id.label("review_id"),
+    ArtifactReviewStatus.decision,
+    ArtifactReviewStatus.comments,
+    ArtifactReviewStatus.reviewed_by,
+    ArtifactReviewStatus.submitted_on,
+)
+
+
+def list_item_rows():
+    """SELECT for ArtifactListItemJSON rows; callers add filters and ordering."""
+    return select(*LIST_ITEM_COLUMNS, *SUMMARY_COLUMNS).outerjoin(
+        ArtifactRatingSummary, ArtifactRatingSummary.artifact_id == KnowledgeArtifact.id
+    )
+
+
+def artifact_rows(review_required: bool = False):
+    """SELECT for ArtifactJSON rows; callers add filters and ordering."""
+    query = select(*LIST_ITEM_COLUMNS, KnowledgeArtifact.content, *SUMMARY_COLUMNS, *REVIEW_COLUMNS).outerjoin(
+        ArtifactRatingSummary, ArtifactRatingSummary.artifact_id == KnowledgeArtifact.id
+    )
+    review_on = ArtifactReviewStatus.artifact_id == KnowledgeArtifact.id
+    if review_required:
+        return query.join(ArtifactReviewStatus, review_on)
+    return query.outerjoin(ArtifactReviewStatus, review_on)
+
+
+async def load_tags(db, artifact_ids) -> dict:
+    tags = {artifact_id: [] for artifact_id in artifact_ids}
+    if tags:
+        rows = await db.execute(
+            select(ArtifactTag.artifact_id, ArtifactTag.tag)
+            .where(ArtifactTag.artifact_id.in_(tags))
+            .order_by(ArtifactTag.tag)
+        )
+        for artifact_id, tag in rows:
+            tags[artifact_id].append(tag)
+    return tags
+
+
+def _rating_summary(row) -> RatingSummaryJSON | None:
+    if row.rating_count is None:
+        return None
+    return {
+        "rating_count": row.rating_count,
+        "rating_sum": row.rating_sum,
+        "average": row.rating_sum / row.rating_count if row.rating_count else None,
+        "bayesian_average": row.bayesian_average,
+        "histogram": {1: row.score_1, 2: row.score_2, 3: row.score_3, 4: row.score_4, 5: row.score_5},
+    }
+
+
+def _review(row) -> ReviewJSON | None:
+    if row.review_id is None:
+        return None
+    return {
+        "id": row.review_id,
+        "artifact_id": row.id,
+        "decision": row.decision,
+        "comments": row.comments,
+        "reviewed_by": row.reviewed_by,
+        "submitted_on": row.submitted_on,
+    }
+
+
+def list_item_json(row, tags: list[str]) -> ArtifactListItemJSON:
+    return {
+        "id": row.id,
+        "title": row.title,
+        "summary": row.summary,
+        "status": row.status,
+        "file": row.file,
+        "created_by": row.created_by,
+        "created_on": row.created_on,
+        "rating_summary": _rating_summary(row),
+        "tags": tags,
+        "file_url": artifact_file_url(row.created_by, row.file, row.file_sha256),
+    }
+
+
+def artifact_json(row, tags: list[str]) -> ArtifactJSON:
+    review = _review(row)
+    return {
+        "id": row.id,
+        "title": row.title,
+        "summary": row.summary,
+        "content": row.content,
+        "status": row.status,
+        "file": row.file,
+        "created_by": row.created_by,
+        "created_on": row.created_on,
+        "review": review,
+        "rating_summary": _rating_summary(row),
+        "tags": tags,
+        "review_requested": review is not None,
+        "file_url": artifact_file_url(row.created_by, row.file, row.file_sha256),
+    }
+
+
+async def dump_artifacts(db, query) -> bytes:
+    rows = (await db.execute(query)).all()
+    tags = await load_tags(db, [row.id for row in rows])
+    return artifact_list_adapter.dump_json([artifact_json(row, tags[row.id]) for row in rows])
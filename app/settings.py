@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 class Settings:
@@ -6,12 +7,157 @@ class Settings:
     SECRET_KEY: str = "your_secret_key"
 
     DATABASE_URL: str = f"sqlite:///{BASE_DIR}/dkn_db.sqlite3"
+    # Serve requests through an asyncio driver (aiosqlite/aiomysql) derived
+    # from DATABASE_URL; False runs the sync driver in the threadpool instead.
+    DATABASE_ASYNC: bool = True
+
+    # Engine options per backend; "auto" picks the profile named after the
+    # DATABASE_URL backend ("sqlite" or "mysql").
+    DATABASE_PROFILE: str = "auto"
+    DATABASE_PROFILES: dict = {
+        "sqlite": {
+            # Set on every new connection. WAL lets readers run alongside
+            # the single writer; NORMAL sync is durable in WAL mode except
+            # across power loss.
+            "pragmas": {
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "mmap_size": 256 * 1024 * 1024,
+                "cache_size": -64 * 1024,  # negative means KiB
+                "busy_timeout": 5000,
+            },
+        },
+        "mysql": {
+            "pool_size": 10,
+            "max_overflow": 20,
+            "pool_timeout": 30,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+            # Compiled statements cached per engine.
+            "query_cache_size": 1200,
+        },
+    }
 
     MEDIA_DIR: Path = BASE_DIR / "static" / "uploads"
     MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    # Base of the absolute file URLs returned by the API.
+    PUBLIC_BASE_URL: str = "http://localhost:8000"
+
+    # Uploads are stored once per distinct content under BLOB_DIR.
+    BLOB_DIR: Path = MEDIA_DIR / "blobs"
+    UPLOAD_TEMP_DIR: Path = MEDIA_DIR / "tmp"
+    MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024
+    # Cap on a whole multipart request, enforced while it is received; the
+    # margin covers the other form fields (Starlette allows 1 MB each).
+    MAX_UPLOAD_REQUEST_SIZE: int = MAX_UPLOAD_SIZE + 8 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+
+    STAT_CACHE_SIZE: int = 4096
+    STAT_CACHE_TTL_SECONDS: int = 30
 
     PASSWORD_HASH_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # Threads reserved for argon2 hashing and verification.
+    PASSWORD_HASH_WORKERS: int = min(4, os.cpu_count() or 1)
+    # argon2 calls allowed to wait for a thread; beyond this, requests get
+    # 429 with Retry-After instead of queuing.
+    PASSWORD_HASH_MAX_QUEUE: int = PASSWORD_HASH_WORKERS * 8
+
+    # Token buckets for the auth routes. "memory" keeps them per process;
+    # "sqlite" shares them between workers through RATE_LIMIT_SQLITE_PATH.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: Path = BASE_DIR / "ratelimit.sqlite3"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # Use the first X-Forwarded-For address; only behind a trusted proxy.
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+    # route -> {"ip" | "user": (requests per minute, burst)}. "user" is the
+    # login email, or the token subject for refresh-token.
+    RATE_LIMITS: dict = {
+        "login": {"ip": (30, 10), "user": (10, 5)},
+        "register": {"ip": (10, 5)},
+        "refresh-token": {"ip": (60, 20), "user": (30, 10)},
+    }
+
+    # Verified tokens are cached per worker, but every hit re-reads the user's
+    # principal generation, so role changes and deletions apply on the next
+    # request everywhere; the TTL only bounds how long a token skips decoding.
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_SIZE: int = 10_000
+
+    TAG_FACET_LIMIT: int = 50
+    TAG_FACET_CACHE_TTL_SECONDS: int = 60
+    TAG_FACET_CACHE_MAX_SIZE: int = 1024
+
+    DASHBOARD_RECENT_ARTIFACTS: int = 5
+    DASHBOARD_CACHE_TTL_SECONDS: int = 30
+    DASHBOARD_CACHE_MAX_SIZE: int = 10_000
+
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    RESPONSE_CACHE_TTL_SECONDS: int = 300
+    # Responses of at least MIN_BYTES are sent br (needs the brotli package),
+    # zstd or gzip encoded to clients that accept it.
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    # Codec for artifact text at rest: "zstd" (Python 3.14+) or "zlib". Shorter
+    # values are stored as they are.
+    TEXT_COMPRESSION_CODEC: str = "zstd"
+    TEXT_COMPRESSION_MIN_BYTES: int = 256
+    # Serialize list endpoints straight from row tuples instead of through
+    # the response models; the JSON is identical either way.
+    FAST_JSON_RESPONSES: bool = False
+
+    PAGE_SIZE: int = 20
+    MAX_PAGE_SIZE: int = 100
+
+    # Bayesian average = (PRIOR_WEIGHT * PRIOR_MEAN + sum) / (PRIOR_WEIGHT + count)
+    RATING_PRIOR_MEAN: float = 3.0
+    RATING_PRIOR_WEIGHT: float = 5.0
+    TRENDING_HALF_LIFE_HOURS: float = 72.0
+
+    # Upload post-processing; run workers with `python app/jobs.py worker`.
+    THUMBNAIL_DIR: Path = MEDIA_DIR / "thumbnails"
+    THUMBNAIL_SIZE: tuple = (320, 320)
+    JOB_WORKER_PROCESSES: int = min(4, os.cpu_count() or 1)
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: int = 10
+    JOB_LEASE_SECONDS: int = 300
+    JOB_POLL_SECONDS: float = 1.0
+    EXTRACTED_TEXT_MAX_CHARS: int = 1_000_000
+    GENERATED_SUMMARY_CHARS: int = 280
+
+    # Review and publication events pushed over /api/events (SSE) and
+    # /api/events/ws. HISTORY_SIZE recent events are kept for Last-Event-ID
+    # resume; a subscriber more than SUBSCRIBER_BUFFER events behind is reset.
+    EVENTS_HISTORY_SIZE: int = 1000
+    EVENTS_SUBSCRIBER_BUFFER: int = 100
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    EVENTS_RETRY_MILLISECONDS: int = 3000
+    # Events of the job worker reach the web processes through the
+    # event_outbox table, polled this often and kept this long.
+    EVENTS_OUTBOX_POLL_SECONDS: float = 1.0
+    EVENTS_OUTBOX_RETENTION_SECONDS: int = 3600
+
+    # Every Nth artifact revision stores the full content; the ones between
+    # store deltas, so reading a revision applies at most N - 1 of them.
+    REVISION_SNAPSHOT_INTERVAL: int = 10
+
+    # Items accepted by one call to the batch get/rate/review endpoints.
+    BATCH_MAX_ITEMS: int = 100
+
+    EXPORT_BATCH_SIZE: int = 500
+    IMPORT_BATCH_SIZE: int = 500
+
+    METRICS_ENABLED: bool = True
+    METRICS_LATENCY_BUCKETS: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    # N+1 detection: "off", "log" or "raise"; see nplusone.py.
+    QUERY_AUDIT: str = "off"
+    QUERY_AUDIT_THRESHOLD: int = 5
+
+    # "fts5" (SQLite only), "python" or "auto" to prefer FTS5 when available.
+    SEARCH_BACKEND: str = "auto"
+
 settings = Settings()
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import tempfile
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
+from sqlalchemy import delete, update
+from starlette.datastructures import Headers
+
+from cache import TTLCache
+from database import upsert
+from models import Blob
+from settings import settings
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# path -> os.stat_result; blobs never change in place, so a hit is safe until
+# the blob or legacy file is removed; legacy files are also re-checked after
+# the TTL.
+stat_cache = TTLCache(settings.STAT_CACHE_SIZE, settings.STAT_CACHE_TTL_SECONDS)
+
+
+def blob_path(sha256: str) -> Path:
+    # Two levels of fan-out keep directories small on large stores.
+    return settings.BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def _write_chunk(file_object, digest, chunk: bytes):
+    digest.update(chunk)
+    file_object.write(chunk)
+
+
+def _finish_write(file_object):
+    file_object.flush()
+    os.fsync(file_object.fileno())
+    file_object.close()
+
+
+def _move_into_store(temp_path: str, sha256: str):
+    target = blob_path(sha256)
+    if target.exists():
+        # Identical content is already stored once; drop the new copy.
+        os.remove(temp_path)
+        return
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, target)
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _stage_upload(upload: UploadFile) -> tuple[str, str, int]:
+    settings.UPLOAD_TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=settings.UPLOAD_TEMP_DIR)
+    file_object = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        while chunk := await upload.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File exceeds the {settings.MAX_UPLOAD_SIZE} byte upload limit",
+                )
+            await run_in_threadpool(_write_chunk, file_object, digest, chunk)
+
+        await run_in_threadpool(_finish_write, file_object)
+    except BaseException:
+        file_object.close()
+        await run_in_threadpool(_remove_quietly, temp_path)
+        raise
+
+    return temp_path, digest.hexdigest(), size
+
+
+async def save_upload(db, upload: UploadFile) -> tuple[str, int]:
+    """Stream an upload into the blob store and return (sha256, size).
+
+    The upload is copied in UPLOAD_CHUNK_SIZE pieces with all file I/O in the
+    threadpool, and is rejected with 413 as soon as it grows past
+    MAX_UPLOAD_SIZE. The blob is fsynced before this returns, and referenced
+    in the caller's transaction.
+
+    The file is moved into the store only after the reference is written.
+    That write holds the blobs row until commit, so remove_orphan() cannot
+    delete the file between the two.
+    """
+    temp_path, sha256, size = await _stage_upload(upload)
+    try:
+        await add_reference(db, sha256, size)
+        await run_in_threadpool(_move_into_store, temp_path, sha256)
+    except BaseException:
+        await run_in_threadpool(_remove_quietly, temp_path)
+        raise
+    return sha256, size
+
+
+def _add_reference(session, sha256: str, size: int):
+    table = Blob.__table__
+    session.execute(upsert(
+        session.get_bind().dialect.name, table, [{"sha256": sha256, "size": size, "ref_count": 1}], ["sha256"],
+        lambda incoming: {"ref_count": table.c.ref_count + incoming.ref_count},
+    ))
+
+
+async def add_reference(db, sha256: str, size: int):
+    await db.run_sync(_add_reference, sha256, size)
+
+
+async def release_reference(db, sha256: str | None) -> bool:
+    """Drop one reference; True means the blob is now unreferenced.
+
+    The caller removes it with remove_orphan() after committing.
+    """
+    if not sha256:
+        return False
+
+    await db.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count - 1)
+    )
+    blob = await db.get(Blob, sha256, populate_existing=True)
+    return blob is not None and blob.ref_count <= 0
+
+
+async def remove_orphan(db, sha256: str):
+    # Only a delete that still finds the blob unreferenced removes the file,
+    # and it does so before committing: an upload of the same content waits
+    # on the row meanwhile, then stores its own copy again.
+    result = await db.execute(delete(Blob).where(Blob.sha256 == sha256, Blob.ref_count <= 0))
+    if result.rowcount:
+        path = blob_path(sha256)
+        stat_cache.pop(str(path))
+        await run_in_threadpool(_remove_quietly, path)
+    await db.commit()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI middleware capping multipart bodies at MAX_UPLOAD_REQUEST_SIZE.
+
+    Starlette spools every file part to disk before the route runs, so
+    oversized requests are refused from Content-Length up front, or cut off
+    while the body is still being received.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        headers = Headers(scope=scope) if scope["type"] == "http" else None
+        if headers is None or not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.MAX_UPLOAD_REQUEST_SIZE
+        too_large = Response(content=f"Request exceeds the {limit} byte upload limit", status_code=413)
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # The form parser reports the aborted body as a 400; the 413
+            # below replaces it.
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+        if exceeded:
+            await too_large(scope, receive, send)
+
+
+def _stat_file(path: str):
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat_result if os.path.isfile(path) else None
+
+
+async def cached_stat(path) -> os.stat_result | None:
+    path = str(path)
+    stat_result = stat_cache.get(path)
+    if stat_result is None:
+        stat_result = await run_in_threadpool(_stat_file, path)
+        if stat_result is not None:
+            stat_cache.set(path, stat_result)
+    return stat_result
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function.
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in candidates
+
+
+def _not_modified(request: Request, etag: str, stat_result: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+
+    return False
+
+
+async def file_response(
+    request: Request,
+    path,
+    filename: str,
+    etag: str | None = None,
+    immutable: bool = False,
+):
+    """Serve a file with validators, 304 handling and byte ranges.
+
+    Range and If-Range (including multipart/byteranges) are handled by
+    FileResponse itself; it is given the cached stat so it does not stat
+    the file again.
+    """
+    stat_result = await cached_stat(path)
+    if stat_result is None:
+        return Response(content="File not found", status_code=404)
+
+    if etag is None:
+        etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+
+    if request.method in ("GET", "HEAD") and _not_modified(request, etag, stat_result):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path=path, filename=filename, stat_result=stat_result, headers=headers)
@@ -0,0 +1,55 @@
+import re
+
+from sqlalchemy import func, select
+
+from models import ArtifactTag, KnowledgeArtifact
+
+MAX_TAG_LENGTH = 64
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_tag(tag: str) -> str:
+    return _WHITESPACE.sub(" ", tag).strip().lower()[:MAX_TAG_LENGTH]
+
+
+def normalize_tags(tags) -> list[str]:
+    # Keeps first-seen order and drops blanks and duplicates.
+    return list(dict.fromkeys(tag for tag in map(normalize_tag, tags) if tag))
+
+
+def parse_tags(value: str | None) -> list[str] | None:
+    """Parse a comma-separated form field; None means "leave tags unchanged"."""
+    if value is None:
+        return None
+    return normalize_tags(value.split(","))
+
+
+def set_tags(session, artifact, tags: list[str]):
+    # Rows for tags that stay are reused, so the (artifact_id, tag) unique
+    # constraint never sees a delete and re-insert of the same pair.
+    current = {tag.tag: tag for tag in artifact.tags}
+    artifact.tags = [current.get(tag) or ArtifactTag(tag=tag) for tag in tags]
+
+
+def tag_filter(tags: list[str], mode: str = "all"):
+    """Artifacts carrying all (or any) of the given tags."""
+    matching = select(ArtifactTag.artifact_id).where(ArtifactTag.tag.in_(tags))
+    if mode == "all":
+        matching = matching.group_by(ArtifactTag.artifact_id).having(
+            func.count(func.distinct(ArtifactTag.tag)) == len(tags)
+        )
+    return KnowledgeArtifact.id.in_(matching)
+
+
+def facet_query(artifact_filters, limit: int):
+    """Tag frequencies over the artifacts matching artifact_filters, in one grouped query."""
+    count = func.count(ArtifactTag.artifact_id)
+    return (
+        select(ArtifactTag.tag, count.label("count"))
+        .join(KnowledgeArtifact, KnowledgeArtifact.id == ArtifactTag.artifact_id)
+        .where(*artifact_filters)
+        .group_by(ArtifactTag.tag)
+        .order_by(count.desc(), ArtifactTag.tag)
+        .limit(limit)
+    )
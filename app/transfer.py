@@ -0,0 +1,317 @@
+import argparse
+import sys
+from datetime import datetime, timezone
+from itertools import islice
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import joinedload, selectinload, undefer
+
+from database import SessionLocal
+from generations import ARTIFACTS, bump, user_scope
+from models import (
+    ArtifactReviewStatus,
+    ArtifactStatus,
+    ArtifactTag,
+    ImportProgress,
+    KnowledgeArtifact,
+    Rating,
+    User,
+)
+from ratings import summarize_ratings
+from schemas import (
+    ArtifactRecord,
+    ArtifactReviewStatusResponse,
+    ImportLineError,
+    ImportProgressResponse,
+    RatingRecord,
+)
+from search import index_artifact
+from tags import normalize_tags
+from settings import settings
+
+# Only the first errors are returned; the counters always cover every line.
+MAX_REPORTED_ERRORS = 100
+
+
+def _utc_naive(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def export_artifacts(session):
+    """Yield every artifact, with tags, review and ratings, as NDJSON lines.
+
+    Rows are streamed from a server-side cursor in EXPORT_BATCH_SIZE batches,
+    so memory stays flat however large the table is. Attachments are not
+    part of the export.
+    """
+    query = (
+        select(KnowledgeArtifact)
+        .options(
+            selectinload(KnowledgeArtifact.tags),
+            selectinload(KnowledgeArtifact.ratings),
+            joinedload(KnowledgeArtifact.review),
+        )
+        .order_by(KnowledgeArtifact.id)
+        .execution_options(yield_per=settings.EXPORT_BATCH_SIZE, stream_results=True)
+    )
+    for artifact in session.scalars(query):
+        record = ArtifactRecord(
+            id=artifact.id,
+            title=artifact.title,
+            summary=artifact.summary,
+            content=artifact.content,
+            status=artifact.status,
+            created_by=artifact.created_by,
+            created_on=artifact.created_on,
+            last_updated=artifact.last_updated,
+            tags=[tag.tag for tag in artifact.tags],
+            review=ArtifactReviewStatusResponse.model_validate(artifact.review) if artifact.review else None,
+            ratings=[RatingRecord.model_validate(rating) for rating in artifact.ratings],
+        )
+        yield record.model_dump_json() + "\n"
+
+
+def export_lines():
+    with SessionLocal() as session:
+        yield from export_artifacts(session)
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'line'}: {detail['msg']}"
+        for detail in error.errors(include_url=False)
+    )
+
+
+def _referenced_users(record: ArtifactRecord) -> set:
+    users = {record.created_by}
+    users.update(rating.user_id for rating in record.ratings)
+    if record.review and record.review.reviewed_by:
+        users.add(record.review.reviewed_by)
+    return users
+
+
+def _insert_batch(session, records: list[tuple[int, ArtifactRecord]], errors: list[ImportLineError]):
+    """Insert one validated batch; returns (imported, skipped, failed)."""
+    artifact_ids = [record.id for _, record in records]
+    existing = set(session.scalars(select(KnowledgeArtifact.id).where(KnowledgeArtifact.id.in_(artifact_ids))))
+
+    referenced = set().union(*(_referenced_users(record) for _, record in records))
+    known_users = set(session.scalars(select(User.id).where(User.id.in_(referenced))))
+
+    fresh = []
+    skipped = failed = 0
+    for line, record in records:
+        # Re-importing the same record is a no-op, which makes retries safe.
+        if record.id in existing:
+            skipped += 1
+            continue
+        missing = _referenced_users(record) - known_users
+        if missing:
+            failed += 1
+            errors.append(ImportLineError(line=line, error=f"Unknown user(s): {', '.join(sorted(map(str, missing)))}"))
+            continue
+        existing.add(record.id)
+        fresh.append(record)
+
+    if not fresh:
+        return 0, skipped, failed
+
+    session.execute(insert(KnowledgeArtifact), [
+        {
+            "id": record.id,
+            "title": record.title,
+            "summary": record.summary,
+            "content": record.content,
+            "status": record.status,
+            "created_by": record.created_by,
+            "created_on": _utc_naive(record.created_on),
+            "last_updated": _utc_naive(record.last_updated or record.created_on),
+        }
+        for record in fresh
+    ])
+
+    tags = [{"artifact_id": record.id, "tag": tag} for record in fresh for tag in normalize_tags(record.tags)]
+    if tags:
+        session.execute(insert(ArtifactTag), tags)
+
+    reviews = [
+        {
+            "id": record.review.id,
+            "artifact_id": record.id,
+            "decision": record.review.decision,
+            "comments": record.review.comments,
+            "reviewed_by": record.review.reviewed_by,
+            "submitted_on": _utc_naive(record.review.submitted_on),
+        }
+        for record in fresh
+        if record.review
+    ]
+    if reviews:
+        session.execute(insert(ArtifactReviewStatus), reviews)
+
+    ratings = [
+        {
+            "id": rating.id,
+            "artifact_id": record.id,
+            "user_id": rating.user_id,
+            "score": rating.score,
+            "rated_on": _utc_naive(rating.rated_on),
+        }
+        for record in fresh
+        for rating in record.ratings
+    ]
+    if ratings:
+        session.execute(insert(Rating), ratings)
+
+    session.add_all(
+        summarize_ratings(
+            record.id,
+            sorted((rating.score, _utc_naive(rating.rated_on)) for rating in record.ratings),
+        )
+        for record in fresh
+        if record.ratings
+    )
+    session.flush()
+
+    bump(session, [ARTIFACTS, *(user_scope(record.created_by) for record in fresh)])
+
+    published = [record.id for record in fresh if record.status == ArtifactStatus.PUBLISHED]
+    if published:
+        query = select(KnowledgeArtifact).options(selectinload(KnowledgeArtifact.tags), undefer(KnowledgeArtifact.extracted_text)).where(KnowledgeArtifact.id.in_(published))
+        for artifact in session.scalars(query):
+            index_artifact(session, artifact)
+
+    return len(fresh), skipped, failed
+
+
+def _import_records(session, records: list[tuple[int, ArtifactRecord]], errors: list[ImportLineError]):
+    """Insert a batch in a savepoint, falling back to one line at a time.
+
+    A database error (a duplicate key, a foreign key) fails the whole batch;
+    retrying line by line imports the rest and counts only the bad lines as
+    failed, so the checkpoint can still move past them.
+    """
+    if not records:
+        return 0, 0, 0
+
+    batch_errors = []
+    try:
+        with session.begin_nested():
+            counts = _insert_batch(session, records, batch_errors)
+        errors.extend(batch_errors)
+        return counts
+    except DBAPIError:
+        pass
+
+    imported = skipped = failed = 0
+    for line, record in records:
+        line_errors = []
+        try:
+            with session.begin_nested():
+                line_imported, line_skipped, line_failed = _insert_batch(session, [(line, record)], line_errors)
+        except DBAPIError as e:
+            line_imported, line_skipped, line_failed = 0, 0, 1
+            line_errors = [ImportLineError(line=line, error=f"{type(e.orig).__name__}: {e.orig}")]
+        errors.extend(line_errors)
+        imported += line_imported
+        skipped += line_skipped
+        failed += line_failed
+    return imported, skipped, failed
+
+
+def import_artifacts(session, lines, import_id: str, on_progress=None) -> ImportProgressResponse:
+    """Import NDJSON artifact lines in IMPORT_BATCH_SIZE transactions.
+
+    Each batch commits together with the import's progress row, so running
+    the same import_id again resumes after the last committed line. Lines
+    the database rejects are counted as failed rather than stopping it.
+    """
+    progress = session.get(ImportProgress, import_id)
+    if progress is None:
+        progress = ImportProgress(import_id=import_id, lines_done=0, imported=0, skipped=0, failed=0, finished=False)
+        session.add(progress)
+        session.commit()
+
+    errors = []
+    numbered = enumerate(lines, start=1)
+    # Lines committed by an earlier run of this import are skipped.
+    for _ in islice(numbered, progress.lines_done):
+        pass
+
+    while batch := list(islice(numbered, settings.IMPORT_BATCH_SIZE)):
+        records = []
+        for line, raw in batch:
+            if not raw.strip():
+                continue
+            try:
+                records.append((line, ArtifactRecord.model_validate_json(raw)))
+            except ValidationError as e:
+                progress.failed += 1
+                errors.append(ImportLineError(line=line, error=_format_validation_error(e)))
+
+        imported, skipped, failed = _import_records(session, records, errors)
+        progress.imported += imported
+        progress.skipped += skipped
+        progress.failed += failed
+        progress.lines_done = batch[-1][0]
+        progress.updated_on = datetime.now(timezone.utc)
+        session.commit()
+
+        if on_progress is not None:
+            on_progress(progress)
+
+    progress.finished = True
+    progress.updated_on = datetime.now(timezone.utc)
+    session.commit()
+
+    response = ImportProgressResponse.model_validate(progress)
+    response.errors = errors[:MAX_REPORTED_ERRORS]
+    return response
+
+
+def import_file(file_object, import_id: str) -> ImportProgressResponse:
+    with SessionLocal() as session:
+        lines = (line.decode("utf-8") for line in file_object)
+        return import_artifacts(session, lines, import_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import artifacts as NDJSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_command = commands.add_parser("export")
+    export_command.add_argument("path", help="output file, or - for stdout")
+
+    import_command = commands.add_parser("import")
+    import_command.add_argument("path", help="NDJSON file to import")
+    import_command.add_argument("--import-id", help="resume key; defaults to the file name")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        output = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8")
+        with output:
+            output.writelines(export_lines())
+        return
+
+    def report(progress):
+        print(
+            f"line {progress.lines_done}: {progress.imported} imported, "
+            f"{progress.skipped} skipped, {progress.failed} failed",
+            file=sys.stderr,
+        )
+
+    with open(args.path, encoding="utf-8") as input_file, SessionLocal() as session:
+        result = import_artifacts(session, input_file, args.import_id or args.path, on_progress=report)
+
+    for error in result.errors:
+        print(f"line {error.line}: {error.error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
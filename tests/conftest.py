@@ -0,0 +1,59 @@
+"""The app runs against a scratch SQLite database and media directory.
+
+Settings are read when the app modules are imported, so they are pointed
+at the scratch directory here, before any test module imports the app.
+"""
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+from settings import settings
+
+WORKDIR = Path(tempfile.mkdtemp(prefix="dkn-test-"))
+settings.DATABASE_URL = f"sqlite:///{WORKDIR / 'test.sqlite3'}"
+settings.MEDIA_DIR = WORKDIR / "uploads"
+settings.BLOB_DIR = settings.MEDIA_DIR / "blobs"
+settings.UPLOAD_TEMP_DIR = settings.MEDIA_DIR / "tmp"
+settings.THUMBNAIL_DIR = settings.MEDIA_DIR / "thumbnails"
+settings.RATE_LIMIT_SQLITE_PATH = WORKDIR / "ratelimit.sqlite3"
+settings.RATE_LIMIT_ENABLED = False
+settings.MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+
+import migrations  # noqa: E402
+
+migrations.upgrade()
+
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _scratch_directory():
+    yield
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_user(client):
+    """Register a user with the given role; returns (user id, auth headers)."""
+    def make(role: str = "CONSULTANT"):
+        email = f"{uuid.uuid4().hex}@example.com"
+        response = client.post("/api/register", json={
+            "email": email, "password": PASSWORD, "name": "Test", "role": role, "region": "EUROPE",
+        })
+        assert response.status_code == 200, response.text
+        token = client.post("/api/login", json={"email": email, "password": PASSWORD}).json()["access_token"]
+        return response.json()["id"], {"Authorization": f"Bearer {token}"}
+
+    return make
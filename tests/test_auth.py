@@ -0,0 +1,36 @@
+import uuid
+
+from sqlalchemy import update
+
+from auth import invalidate_user, principal_cache
+from database import SessionLocal
+from models import SystemRole, User
+
+
+def test_cached_token_follows_role_change_and_deletion(client, make_user):
+    user_id, headers = make_user("ADMIN")
+    assert client.get("/api/review-requests", headers=headers).status_code == 200
+    assert principal_cache.get(headers["Authorization"].removeprefix("Bearer ")) is not None
+
+    # The change bumps the principal generation the cached snapshot is
+    # checked against; the snapshot itself stays in the cache.
+    with SessionLocal() as session:
+        session.get(User, uuid.UUID(user_id)).role = SystemRole.CONSULTANT
+        session.commit()
+    assert client.get("/api/review-requests", headers=headers).status_code == 403
+
+    with SessionLocal() as session:
+        session.delete(session.get(User, uuid.UUID(user_id)))
+        session.commit()
+    assert client.get("/api/review-requests", headers=headers).status_code == 401
+
+
+def test_bulk_update_invalidates_through_invalidate_user(client, make_user):
+    user_id, headers = make_user("ADMIN")
+    assert client.get("/api/review-requests", headers=headers).status_code == 200
+
+    with SessionLocal() as session:
+        session.execute(update(User).where(User.id == uuid.UUID(user_id)).values(role=SystemRole.CONSULTANT))
+        invalidate_user(session.connection(), uuid.UUID(user_id))
+        session.commit()
+    assert client.get("/api/review-requests", headers=headers).status_code == 403
@@ -0,0 +1,51 @@
+import uuid
+
+from sqlalchemy import update
+
+from database import SessionLocal
+from models import KnowledgeArtifact
+from settings import settings
+
+
+def _create(client, headers, filename: str, body: bytes) -> dict:
+    response = client.post(
+        "/api/create-artifact",
+        data={"title": "With file", "summary": "Has a file", "content": "Content", "status": "DRAFT"},
+        files={"file": (filename, body, "text/plain")},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_replacing_legacy_file_forgets_its_cached_stat(client, make_user):
+    user_id, headers = make_user()
+    filename = f"{uuid.uuid4().hex}.txt"
+    artifact = _create(client, headers, filename, b"blob copy")
+
+    # Uploads made before the blob store have no sha256 and live under the
+    # owner's media directory.
+    legacy_path = settings.MEDIA_DIR / user_id / "artifacts" / filename
+    legacy_path.parent.mkdir(parents=True, exist_ok=True)
+    legacy_path.write_bytes(b"legacy copy")
+    with SessionLocal() as session:
+        session.execute(
+            update(KnowledgeArtifact)
+            .where(KnowledgeArtifact.id == uuid.UUID(artifact["id"]))
+            .values(file_sha256=None)
+        )
+        session.commit()
+
+    url = f"/api/files/{user_id}/artifacts/{filename}"
+    assert client.get(url).content == b"legacy copy"
+
+    response = client.put(
+        f"/api/artifacts/{artifact['id']}",
+        data={"title": "With file", "summary": "Has a file", "content": "Content", "status": "DRAFT"},
+        files={"file": ("replacement.txt", b"replacement", "text/plain")},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+
+    assert not legacy_path.exists()
+    assert client.get(url).status_code == 404
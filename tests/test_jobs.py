@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+import jobs
+from database import SessionLocal
+from models import Job, JobState
+
+
+def _claim(session, worker_id: str, artifact_id: str) -> Job:
+    """Claim jobs until the one for artifact_id comes up."""
+    while (job := jobs.claim_job(session, worker_id)) is not None:
+        if str(job.artifact_id) == artifact_id:
+            return job
+    raise AssertionError(f"no runnable job for artifact {artifact_id}")
+
+
+def test_job_claimed_again_after_its_lease_lapsed_is_applied_once(client, make_user):
+    _, headers = make_user()
+    response = client.post(
+        "/api/create-artifact",
+        data={"title": "Slow job", "content": "Content", "status": "DRAFT"},
+        files={"file": ("slow.txt", b"Processed text. It is long enough to summarize.", "text/plain")},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    artifact_id = response.json()["id"]
+
+    with SessionLocal(expire_on_commit=False) as first, SessionLocal(expire_on_commit=False) as second:
+        stalled = _claim(first, "first", artifact_id)
+        result = jobs.process_file(stalled.file_sha256, "slow.txt")
+
+        first.execute(update(Job).where(Job.id == stalled.id).values(lease_expires_on=jobs._utcnow() - timedelta(seconds=1)))
+        first.commit()
+        reclaimed = _claim(second, "second", artifact_id)
+
+        jobs.apply_result(second, reclaimed, "second", result)
+        with pytest.raises(jobs.LeaseLost):
+            jobs.apply_result(first, stalled, "first", result)
+        jobs.renew_leases(first, [stalled], "first")
+        with pytest.raises(jobs.LeaseLost):
+            jobs._set_step(first, stalled, "first", "saving", 0.8)
+        jobs.fail_job(first, stalled, "first", RuntimeError("late"))
+
+        job = second.get(Job, reclaimed.id, populate_existing=True)
+        assert (job.state, job.worker_id, job.last_error) == (JobState.SUCCEEDED, "second", None)
+
+    revisions = client.get(f"/api/artifacts/{artifact_id}/revisions", headers=headers).json()
+    assert len(revisions) == 2
+    assert client.get(f"/api/artifacts/{artifact_id}", headers=headers).json()["summary"] == "Processed text. It is long enough to summarize."
@@ -0,0 +1,70 @@
+import json
+import uuid
+
+
+def _record(created_by, **fields) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "title": "Imported",
+        "summary": "An imported artifact",
+        "content": "Imported content",
+        "status": "PUBLISHED",
+        "created_by": created_by,
+        "created_on": "2025-01-01T00:00:00",
+        **fields,
+    }
+
+
+def _rating(user_id, artifact_id, score) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "artifact_id": artifact_id,
+        "user_id": user_id,
+        "score": score,
+        "rated_on": "2025-01-02T00:00:00",
+    }
+
+
+def _import(client, headers, records):
+    body = "".join(json.dumps(record) + "\n" for record in records)
+    response = client.post("/api/import/artifacts", params={"import_id": uuid.uuid4().hex}, content=body, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_import_rejects_out_of_range_score_on_its_own(client, make_user):
+    admin_id, admin = make_user("ADMIN")
+    good = _record(admin_id)
+    good["ratings"] = [_rating(admin_id, good["id"], 5)]
+    bad = _record(admin_id)
+    bad["ratings"] = [_rating(admin_id, bad["id"], 9)]
+
+    result = _import(client, admin, [good, bad])
+
+    assert (result["imported"], result["failed"]) == (1, 1)
+    assert result["errors"][0]["line"] == 2
+    assert "ratings.0.score" in result["errors"][0]["error"]
+    assert client.get(f"/api/artifacts/{good['id']}").json()["rating_summary"]["rating_count"] == 1
+    assert client.get(f"/api/artifacts/{bad['id']}").status_code == 404
+
+
+def test_import_without_summary_round_trips(client, make_user):
+    admin_id, admin = make_user("ADMIN")
+    missing = _record(admin_id, title="No summary")
+    del missing["summary"]
+    null = _record(admin_id, title="Null summary", summary=None)
+
+    result = _import(client, admin, [missing, null])
+    assert (result["imported"], result["failed"]) == (2, 0)
+
+    listing = client.get("/api/artifacts", params={"limit": 100})
+    assert listing.status_code == 200, listing.text
+    summaries = {item["id"]: item["summary"] for item in listing.json()["items"]}
+    assert summaries[missing["id"]] == summaries[null["id"]] == ""
+    assert client.get(f"/api/artifacts/{missing['id']}").json()["summary"] == ""
+    assert client.get("/api/search", params={"q": "summary"}).status_code == 200
+
+    exported = [line for line in client.get("/api/export/artifacts", headers=admin).text.splitlines()]
+    again = _import(client, admin, [json.loads(line) for line in exported])
+    assert again["failed"] == 0
+    assert again["skipped"] == len(exported)